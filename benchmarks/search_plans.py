@@ -0,0 +1,90 @@
+"""Check that track searches in Postgres are served by the trigram indexes.
+
+Each query is run under EXPLAIN ANALYZE with sequential scans disabled, so the plan shows which
+indexes the query can use whatever the size of the tracks table. The indexes and the execution
+time of each plan are printed. The check fails, exiting with 1, if a plan scans tracks
+sequentially or doesn't use the trigram indexes on the search keys: a query matched against
+either column needs both, one matched as "Artist - Title" at least one.
+
+Needs the Postgres server from the environment, migrated to the latest revision.
+
+Run with `python -m benchmarks.search_plans`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from typing import Any
+
+from bot.core.loader import sessionmaker
+from bot.services import search
+from bot.services import track as track_service
+
+SEARCH_KEY_INDEXES = frozenset({"ix_tracks_artist_search_key_trgm", "ix_tracks_title_search_key_trgm"})
+# A single word, several words and "Artist - Title", in Cyrillic and in Latin
+QUERIES = (
+    "Кино",
+    "Кино Группа крови",
+    "Кино - Группа крови",
+    "the weeknd blinding lights",
+)
+
+
+def get_plan_nodes(plan: dict[str, Any]) -> list[dict[str, Any]]:
+    """Get the node and all nodes below it."""
+    nodes = [plan]
+    for subplan in plan.get("Plans", []):
+        nodes.extend(get_plan_nodes(subplan))
+    return nodes
+
+
+async def explain(track_query: str) -> dict[str, Any]:
+    """Get the analyzed plan of the search for the query."""
+    query = track_service.build_search_query(search.get_search_strategies(track_query))
+
+    async with sessionmaker() as session:
+        await track_service.set_similarity_threshold(session, 0.3)
+        connection = await session.connection()
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+        compiled = query.compile(connection.dialect)
+        result = await connection.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {compiled}", compiled.params)
+        (explained,) = result.scalar_one()
+
+    return explained
+
+
+def get_required_index_count(track_query: str) -> int:
+    """Get how many of the search key indexes the plan of the query has to use."""
+    # A query matched against the artist or the title is a bitmap OR of both indexes
+    if any(artist is None for artist, _ in search.get_search_strategies(track_query)):
+        return len(SEARCH_KEY_INDEXES)
+
+    return 1
+
+
+async def main() -> int:
+    failures = 0
+    for track_query in QUERIES:
+        explained = await explain(track_query)
+        nodes = get_plan_nodes(explained["Plan"])
+        indexes = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+        seq_scans = [node for node in nodes if node["Node Type"] == "Seq Scan" and node["Relation Name"] == "tracks"]
+        required_count = get_required_index_count(track_query)
+
+        status = "ok"
+        if seq_scans:
+            failures += 1
+            status = f"FAIL, {len(seq_scans)} scans of tracks"
+        elif len(SEARCH_KEY_INDEXES.intersection(indexes)) < required_count:
+            failures += 1
+            status = f"FAIL, expected {required_count} of {sorted(SEARCH_KEY_INDEXES)}"
+
+        print(f"{track_query!r:<30} | {status}, {explained['Execution Time']:.2f} ms, indexes {indexes}")
+
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
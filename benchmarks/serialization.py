@@ -0,0 +1,56 @@
+"""Compare cache payload size and (de)serialization time of PickleSerializer and ModelSerializer.
+
+Run with `python -m benchmarks.serialization`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import timeit
+
+from bot.cache.serialization import AbstractSerializer, ModelSerializer, PickleSerializer
+from bot.database.models import TrackModel
+
+NUMBER = 10_000
+
+
+def build_page(size: int = 10) -> list[tuple[TrackModel, int]]:
+    """Build a page shaped like a page of the top."""
+    created_at = datetime.datetime.now(datetime.UTC)
+    return [
+        (
+            TrackModel(
+                id=track_id,
+                artist=f"Artist {track_id}",
+                title=f"Track title {track_id}",
+                tiktok_url=None,
+                youtube_url=None,
+                created_at=created_at,
+            ),
+            size - track_id,
+        )
+        for track_id in range(size)
+    ]
+
+
+def measure(name: str, serializer: AbstractSerializer, value: object) -> None:
+    payload = serializer.serialize(value)
+
+    serialize_time = timeit.timeit(lambda: serializer.serialize(value), number=NUMBER) / NUMBER
+    deserialize_time = timeit.timeit(lambda: serializer.deserialize(payload), number=NUMBER) / NUMBER
+
+    print(
+        f"{name:<8} | {len(payload):>6} bytes | "
+        f"serialize {serialize_time * 1e6:>7.1f} us | deserialize {deserialize_time * 1e6:>7.1f} us",
+    )
+
+
+def main() -> None:
+    page = build_page()
+
+    measure("pickle", PickleSerializer(), page)
+    measure("model", ModelSerializer(TrackModel), page)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare votes per second of inserting each vote in its own transaction and of buffered votes.
+
+Each vote runs through a session the way DatabaseMiddleware drives a handler: create_vote,
+commit, then the queued cache invalidations. Buffered votes are measured twice, until every
+vote is acknowledged and until the writer has inserted them all.
+
+Needs the Postgres and Redis servers from the environment. The benchmark creates its own users
+and tracks and deletes them, with their votes, when done.
+
+Run with `python -m benchmarks.votes`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from sqlalchemy import delete
+
+from bot.cache.invalidation import apply_invalidations
+from bot.core.loader import redis_client, sessionmaker, settings
+from bot.database.models import TrackModel, UserModel
+from bot.services import vote as vote_service
+from bot.services.normalization import normalize
+
+USERS = 1_000
+# Far above real Telegram ids, so benchmark users never collide with actual ones
+FIRST_USER_ID = 10**15
+
+
+async def create_fixtures() -> tuple[int, int]:
+    """Create the users and one track for each benchmark run.
+
+    Returns:
+        Ids of the tracks voted for by the direct and the buffered run.
+
+    """
+    async with sessionmaker() as session:
+        session.add_all(UserModel(id=FIRST_USER_ID + index) for index in range(USERS))
+        tracks = [
+            TrackModel(
+                artist="Benchmark",
+                title=f"Votes {name}",
+                artist_search_key=normalize("Benchmark"),
+                title_search_key=normalize(f"Votes {name}"),
+            )
+            for name in ("direct", "buffered")
+        ]
+        session.add_all(tracks)
+        await session.commit()
+
+    return tracks[0].id, tracks[1].id
+
+
+async def delete_fixtures(track_ids: tuple[int, int]) -> None:
+    async with sessionmaker() as session:
+        await session.execute(delete(TrackModel).where(TrackModel.id.in_(track_ids)))
+        await session.execute(delete(UserModel).where(UserModel.id >= FIRST_USER_ID))
+        await session.commit()
+
+
+async def vote(track_id: int) -> float:
+    """Vote for the track once from every user.
+
+    Returns:
+        Seconds until the last vote was acknowledged.
+
+    """
+    start = time.perf_counter()
+    for index in range(USERS):
+        async with sessionmaker() as session:
+            await vote_service.create_vote(session, user_id=FIRST_USER_ID + index, track_id=track_id)
+            await session.commit()
+            await apply_invalidations(session)
+
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    track_ids = await create_fixtures()
+    try:
+        settings.votes.buffered = False
+        direct = await vote(track_ids[0])
+
+        settings.votes.buffered = True
+        start = time.perf_counter()
+        acknowledged = await vote(track_ids[1])
+        await vote_service.create_vote_writers_group(redis_client)
+        while await vote_service.write_votes(redis_client):
+            pass
+        inserted = time.perf_counter() - start
+    finally:
+        await delete_fixtures(track_ids)
+
+    print(f"direct            | {USERS / direct:>8.0f} votes/s")
+    print(f"buffered, acked   | {USERS / acknowledged:>8.0f} votes/s")
+    print(f"buffered, written | {USERS / inserted:>8.0f} votes/s (batches of {settings.votes.batch_size})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
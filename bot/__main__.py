@@ -6,6 +6,9 @@ import sys
 from aiogram_dialog import setup_dialogs
 from loguru import logger
 
+from bot.cache.metrics import log_metrics
+from bot.cache.redis import listen_invalidations
+from bot.cache.warmup import warm_up_cache
 from bot.commands import (
     remove_commands,
     set_commands,
@@ -14,6 +17,11 @@ from bot.core.loader import bot, dp, last_fm_client, scheduler, sessionmaker, se
 from bot.dialogs import get_dialogs_router
 from bot.handlers import get_handlers_router
 from bot.middleware import register_middlewares
+from bot.services import leaderboard, search, voters
+from bot.services import track as track_service
+from bot.services import vote as vote_service
+
+background_tasks: set[asyncio.Task] = set()
 
 
 async def on_startup() -> None:
@@ -33,9 +41,46 @@ async def on_startup() -> None:
 
     await set_commands(bot, admin_id=settings.bot.admin_id)
 
+    scheduler.add_job(log_metrics, trigger="interval", hours=1)
+    scheduler.add_job(
+        warm_up_cache,
+        trigger="interval",
+        seconds=settings.cache.warmup_interval,
+        kwargs={"bot": bot, "pages": settings.cache.warmup_pages, "refresh": True},
+    )
+    scheduler.add_job(track_service.reconcile_vote_counts, trigger="interval", days=1)
+    scheduler.add_job(search.load_search_index, trigger="interval", seconds=settings.search.reload_interval)
+    # Runs once right away, votes are checked in Postgres until it's done
+    scheduler.add_job(voters.backfill)
+    if leaderboard.is_maintained():
+        scheduler.add_job(
+            leaderboard.reconcile,
+            trigger="interval",
+            seconds=settings.leaderboard.reconcile_interval,
+        )
+    if leaderboard.is_trending_enabled():
+        scheduler.add_job(
+            leaderboard.reconcile_trending,
+            trigger="interval",
+            seconds=settings.leaderboard.reconcile_interval,
+        )
+    if settings.leaderboard.backend == "view":
+        scheduler.add_job(
+            track_service.refresh_top_tracks_view,
+            trigger="interval",
+            seconds=settings.leaderboard.view_refresh_interval,
+        )
     scheduler.start()
 
-    bot_info = await bot.get_me()
+    background_tasks.add(asyncio.create_task(listen_invalidations()))
+    if settings.votes.buffered:
+        background_tasks.add(asyncio.create_task(vote_service.run_vote_writer()))
+
+    await warm_up_cache(bot, pages=settings.cache.warmup_pages)
+    # Until loaded, tracks are searched in Postgres
+    await search.load_search_index()
+
+    bot_info = await bot.me()
     logger.info(f"name     - {bot_info.full_name}")
     logger.info(f"username - @{bot_info.username}")
     logger.info(f"id       - {bot_info.id}")
@@ -48,6 +93,9 @@ async def on_shutdown() -> None:
 
     await remove_commands(bot, admin_id=settings.bot.admin_id)
 
+    for task in background_tasks:
+        task.cancel()
+
     await dp.storage.close()
     await dp.fsm.storage.close()
 
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+from bot.cache.redis import PENDING_INVALIDATIONS, CacheSpec, invalidation_prefix, queue_invalidation
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from redis.asyncio import Redis
+    from redis.asyncio.client import Pipeline
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Key of the invalidations of committed transactions waiting to be applied in Session.info
+COMMITTED_INVALIDATIONS = "committed_cache_invalidations"
+
+
+class InvalidationBatch:
+    """Cache invalidations of a transaction, applied together in one pipeline per Redis client."""
+
+    def __init__(self) -> None:
+        self.__targets: dict[str, tuple[CacheSpec, tuple[Any, ...], dict[str, Any]]] = {}
+        self.__commands: list[tuple[Redis, Callable[[Pipeline], Awaitable[Any]]]] = []
+        self.__callbacks: list[Callable[[], Any]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.__targets or self.__commands or self.__callbacks)
+
+    def add(self, func: Callable, *args: Any, **kwargs: Any) -> None:
+        """Add an invalidation of a cached function, with the arguments clear_cache takes."""
+        spec: CacheSpec = func.cache_spec  # pyright: ignore[reportAttributeAccessIssue]
+        prefix = invalidation_prefix(spec, args, kwargs)
+
+        # The prefix determines the commands, invalidating it twice would only repeat them
+        self.__targets.setdefault(prefix, (spec, args, kwargs))
+
+    def add_command(self, cache: Redis, command: Callable[[Pipeline], Awaitable[Any]]) -> None:
+        """Add a command queueing other writes to the pipeline of the Redis client."""
+        self.__commands.append((cache, command))
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """Add a callback updating in-process state, called before the Redis commands run."""
+        self.__callbacks.append(callback)
+
+    def covers(self, full_key: str) -> bool:
+        """Whether the entry under the full key is invalidated by the batch."""
+        return any(full_key.startswith(prefix) for prefix in self.__targets)
+
+    async def execute(self) -> None:
+        """Run all callbacks, invalidations and commands, one round trip per Redis client."""
+        for callback in self.__callbacks:
+            callback()
+
+        pipelines: dict[Redis, Pipeline] = {}
+
+        for spec, args, kwargs in self.__targets.values():
+            pipeline = pipelines.setdefault(spec.cache, spec.cache.pipeline(transaction=False))
+            await queue_invalidation(pipeline, spec, args, kwargs)
+
+        for cache, command in self.__commands:
+            pipeline = pipelines.setdefault(cache, cache.pipeline(transaction=False))
+            await command(pipeline)
+
+        for pipeline in pipelines.values():
+            async with pipeline:
+                await pipeline.execute()
+
+
+def invalidate(session: AsyncSession, func: Callable, *args: Any, **kwargs: Any) -> None:
+    """Invalidate the cache of a function once the session's transaction commits.
+
+    Takes the same arguments as clear_cache. Nothing is invalidated if the transaction
+    is rolled back, and until it commits reads through the session bypass the entries.
+    """
+    _get_pending(session).add(func, *args, **kwargs)
+
+
+def on_commit(
+    session: AsyncSession,
+    cache: Redis,
+    command: Callable[[Pipeline], Awaitable[Any]],
+) -> None:
+    """Queue a command to the invalidation pipeline of the session's transaction."""
+    _get_pending(session).add_command(cache, command)
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Any]) -> None:
+    """Call the callback once the session's transaction commits, e.g. to update in-process state."""
+    _get_pending(session).add_callback(callback)
+
+
+async def apply_invalidations(session: AsyncSession) -> None:
+    """Apply the invalidations of the transactions the session committed."""
+    batches: list[InvalidationBatch] = session.info.pop(COMMITTED_INVALIDATIONS, [])
+
+    for batch in batches:
+        try:
+            await batch.execute()
+        except RedisError as e:
+            logger.exception(f"Failed to invalidate cache: {e}")
+
+
+def _get_pending(session: AsyncSession) -> InvalidationBatch:
+    batch = session.info.get(PENDING_INVALIDATIONS)
+    if batch is None:
+        batch = session.info[PENDING_INVALIDATIONS] = InvalidationBatch()
+    return batch
+
+
+@event.listens_for(Session, "after_commit")
+def _move_committed_invalidations(session: Session) -> None:
+    # Releasing a savepoint commits nothing yet
+    if session.in_nested_transaction():
+        return
+
+    batch: InvalidationBatch | None = session.info.pop(PENDING_INVALIDATIONS, None)
+    if batch:
+        session.info.setdefault(COMMITTED_INVALIDATIONS, []).append(batch)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_invalidations(session: Session, previous_transaction: SessionTransaction) -> None:
+    # Rolling back to a savepoint keeps the invalidations, they may only be redundant
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_INVALIDATIONS, None)
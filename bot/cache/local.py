@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Invalidations remembered to tell whether a value read before one of them is outdated
+MAX_TRACKED_INVALIDATIONS = 1_000
+
+
+class LocalCache:
+    """In-process LRU cache of serialized values bounded by entry count and total payload size."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.__entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        # Incremented by every invalidation, read before a value is fetched and passed to set
+        self.epoch = 0
+        self.__invalidations: deque[tuple[int, str]] = deque(maxlen=MAX_TRACKED_INVALIDATIONS)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: str) -> bytes | None:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.__pop(key)
+            return None
+
+        self.__entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float, since: int | None = None) -> None:
+        """Keep the value for ttl seconds.
+
+        With since set to the epoch read before the value was fetched, the value is dropped
+        if the key was invalidated in the meantime, as it may predate the invalidation.
+        """
+        self.__pop(key)
+
+        if since is not None and self.is_invalidated_since(key, since):
+            return
+
+        if len(value) > self.max_bytes:
+            return
+
+        self.__entries[key] = (value, time.monotonic() + ttl)
+        self.size += len(value)
+
+        while len(self.__entries) > self.max_entries or self.size > self.max_bytes:
+            oldest_key = next(iter(self.__entries))
+            self.__pop(oldest_key)
+
+    def invalidate(self, prefix: str) -> None:
+        """Drop all entries whose key starts with the prefix."""
+        self.epoch += 1
+        self.__invalidations.append((self.epoch, prefix))
+
+        for key in [key for key in self.__entries if key.startswith(prefix)]:
+            self.__pop(key)
+
+    def clear(self) -> None:
+        self.epoch += 1
+        # Every key starts with the empty prefix
+        self.__invalidations.append((self.epoch, ""))
+
+        self.__entries.clear()
+        self.size = 0
+
+    def is_invalidated_since(self, key: str, epoch: int) -> bool:
+        """Whether the key was invalidated after the epoch, or may have been if it's too old to tell."""
+        if epoch >= self.epoch:
+            return False
+
+        # Invalidations right after the epoch were forgotten
+        if len(self.__invalidations) < self.epoch - epoch:
+            return True
+
+        for invalidated_at, prefix in reversed(self.__invalidations):
+            if invalidated_at <= epoch:
+                break
+            if key.startswith(prefix):
+                return True
+
+        return False
+
+    def __pop(self, key: str) -> None:
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import time
+from dataclasses import MISSING, dataclass, field, fields
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+
+
+@dataclass(slots=True)
+class Summary:
+    """Count, sum and maximum of observed values, such as latencies in seconds or sizes in bytes."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+
+@dataclass(slots=True)
+class CacheMetrics:
+    local_hits: int = 0
+    local_misses: int = 0
+    redis_hits: int = 0
+    redis_misses: int = 0
+    stale_hits: int = 0
+    # Reads of entries invalidated by the caller's uncommitted transaction
+    bypasses: int = 0
+    invalidations: int = 0
+    redis_get: Summary = field(default_factory=Summary)
+    redis_set: Summary = field(default_factory=Summary)
+    recompute: Summary = field(default_factory=Summary)
+    payload_size: Summary = field(default_factory=Summary)
+
+    @property
+    def hits(self) -> int:
+        return self.local_hits + self.redis_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of reads served from either cache tier."""
+        reads = self.hits + self.redis_misses
+        return self.hits / reads if reads else 0.0
+
+    def export(self) -> dict[str, float]:
+        """Flatten the metrics into a dict of numbers, summaries as count, mean and max."""
+        values: dict[str, float] = {"hits": self.hits, "hit_ratio": self.hit_ratio}
+
+        for metric in fields(self):
+            value = getattr(self, metric.name)
+            if isinstance(value, Summary):
+                values[f"{metric.name}_count"] = value.count
+                values[f"{metric.name}_mean"] = value.mean
+                values[f"{metric.name}_max"] = value.max
+            else:
+                values[metric.name] = value
+
+        return values
+
+    def reset(self) -> None:
+        for metric in fields(self):
+            default = metric.default_factory() if metric.default_factory is not MISSING else metric.default
+            setattr(self, metric.name, default)
+
+
+registry: dict[str, CacheMetrics] = {}
+
+
+def get_metrics(name: str) -> CacheMetrics:
+    """Get the metrics of a cached function, registering them on first use."""
+    return registry.setdefault(name, CacheMetrics())
+
+
+def export_metrics(*, reset: bool = False) -> dict[str, dict[str, float]]:
+    """Export the metrics of all cached functions, keyed by module.function.
+
+    With reset set, the counters start over, so consecutive exports cover disjoint periods.
+    """
+    exported = {name: metrics.export() for name, metrics in registry.items()}
+
+    if reset:
+        # Cached functions hold their metrics, so they are reset in place
+        for metrics in registry.values():
+            metrics.reset()
+
+    return exported
+
+
+def log_metrics() -> None:
+    """Log a summary line per cached function and reset the counters."""
+    for name, values in export_metrics(reset=True).items():
+        if not values["hits"] and not values["redis_misses"] and not values["invalidations"]:
+            continue
+
+        logger.info(
+            f"cache {name}: "
+            f"hit ratio {values['hit_ratio']:.1%} ({values['hits']:.0f} hits, {values['redis_misses']:.0f} misses, "
+            f"{values['stale_hits']:.0f} stale), {values['invalidations']:.0f} invalidations, "
+            f"get {values['redis_get_mean'] * 1000:.2f} ms, set {values['redis_set_mean'] * 1000:.2f} ms, "
+            f"recompute {values['recompute_mean'] * 1000:.1f} ms (max {values['recompute_max'] * 1000:.1f} ms), "
+            f"payload {values['payload_size_mean']:.0f} B (max {values['payload_size_max']:.0f} B)",
+        )
+
+
+async def measure[T](summary: Summary, awaitable: Awaitable[T]) -> T:
+    """Await the awaitable and observe how long it took in seconds."""
+    started_at = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        summary.observe(time.perf_counter() - started_at)
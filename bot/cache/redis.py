@@ -1,23 +1,105 @@
 from __future__ import annotations
 
+import asyncio
 import inspect
+import math
+import random
+import time
+from contextlib import suppress
+from dataclasses import dataclass, replace
+from datetime import timedelta
 from functools import wraps
+from itertools import chain
 from typing import TYPE_CHECKING, Any
 
+from loguru import logger
+from redis.exceptions import LockError, RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.cache.local import LocalCache
+from bot.cache.metrics import CacheMetrics, get_metrics, measure
 from bot.cache.serialization import AbstractSerializer, PickleSerializer
-from bot.core.loader import redis_client
+from bot.core.loader import redis_client, sessionmaker
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
-    from datetime import timedelta
+    from collections.abc import Callable, Hashable, Iterable
 
     from redis.asyncio import Redis
+    from redis.asyncio.client import Pipeline
 
 MINUTE = 60
 HOUR = 60 * MINUTE
 DAY = 24 * HOUR
 DEFAULT_TTL = 5 * MINUTE
 
+HEADER_SEPARATOR = b"|"
+INVALIDATION_CHANNEL = "cache:invalidations"
+LOCK_POLL_INTERVAL = 0.05
+
+# Key of the uncommitted invalidations of a transaction in AsyncSession.info
+PENDING_INVALIDATIONS = "cache_invalidations"
+
+local_cache = LocalCache()
+
+# Recomputations running in this process, shared by concurrent misses of the same key
+_inflight: dict[str, asyncio.Future[bytes]] = {}
+
+# Keys with a scheduled background refresh, and references keeping those tasks alive
+_refreshing: set[str] = set()
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+@dataclass(frozen=True, slots=True)
+class CacheSpec:
+    """Describes how the entries of a cached function are stored and invalidated."""
+
+    cache: Redis
+    namespace: str
+    prefix: str
+    generation_key: str
+    lock_prefix: str
+    key_builder: Callable[..., str]
+    ttl: int | timedelta
+    serializer: AbstractSerializer
+    versioned: bool
+    version_depth: int
+    # Components of the key of a single entry, None if the key builder can't tell
+    key_size: int | None
+    local_ttl: int | None
+    lock_timeout: float | None
+    soft_ttl: int | None
+    early_refresh: float | None
+    metrics: CacheMetrics
+
+    @property
+    def timed(self) -> bool:
+        """Whether entries carry their soft expiration time and recomputation duration."""
+        return self.soft_ttl is not None or self.early_refresh is not None
+
+    @property
+    def header_size(self) -> int:
+        return int(self.versioned) + 2 * int(self.timed)
+
+    def build_generation_keys(self, key: str) -> list[str]:
+        """Return generation counters the entry under the key depends on."""
+        keys = [self.generation_key]
+        if self.version_depth:
+            keys.append(f"{self.generation_key}:{key_prefix(key, self.version_depth)}")
+        return keys
+
+
+@dataclass(frozen=True, slots=True)
+class CacheEntry:
+    tag: bytes
+    payload: bytes | None = None
+    # Payload of an outdated generation, still good enough to serve while a fresh one is computed
+    stale: bytes | None = None
+    # The payload is served, but should be recomputed in the background
+    refresh: bool = False
+    # Epoch of the local cache before the entry was read, a value computed for it is only kept
+    # locally if the key wasn't invalidated since
+    epoch: int = 0
+
 
 def build_key(*args: Any, **kwargs: Any) -> str:
     """Build a string key based on provided arguments and keyword arguments."""
@@ -26,26 +108,90 @@ def build_key(*args: Any, **kwargs: Any) -> str:
     return f"{args_str}:{kwargs_str}"
 
 
-def build_key_with_defaults(
-    *param_names: str,
-) -> Callable[[Callable], Callable[..., str]]:
-    """Create a key builder factory that uses inspect to fill in default parameter values."""
+def key_prefix(key: str, depth: int) -> str:
+    """Return the first depth components of a key built with build_key."""
+    return ":".join(key.split(":")[:depth]) + ":"
 
-    def factory(func: Callable) -> Callable[..., str]:
-        sig = inspect.signature(func)
 
-        def key_builder(*args: Any, **kwargs: Any) -> str:
-            # Bind arguments to the function signature to get defaults
-            bound = sig.bind(*args, **kwargs)
-            bound.apply_defaults()
+def get_key_size(func: Callable, key_builder: Callable[..., str]) -> int | None:
+    """Return the number of components of the keys of func, built from placeholder arguments.
 
-            # Extract only the specified parameters
-            values = [bound.arguments.get(name) for name in param_names]
-            return build_key(*(value for value in values if value is not None))
+    Returns None for functions taking any number of arguments and key builders that need
+    actual values.
+    """
+    args: list[object] = []
+    kwargs: dict[str, object] = {}
+    for parameter in inspect.signature(func).parameters.values():
+        if parameter.kind in {parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD}:
+            return None
+        if parameter.kind is parameter.KEYWORD_ONLY:
+            kwargs[parameter.name] = object()
+        else:
+            args.append(object())
+
+    try:
+        key = key_builder(*args, **kwargs)
+    except Exception:  # noqa: BLE001
+        return None
+
+    key = key.rstrip(":")
+    return len(key.split(":")) if key else 0
+
+
+class KeyBuilderFactory:
+    """Compiles a key function for each decorated function when the cached decorator is applied.
+
+    The key function is generated with the decorated function's own signature, so Python binds
+    positional, keyword and default arguments itself and no inspect call is left on the hot path.
+    """
 
+    def __init__(self, *param_names: str) -> None:
+        self.param_names = param_names
+
+    def __call__(self, func: Callable) -> Callable[..., str]:
+        signature = inspect.signature(func)
+        namespace: dict[str, Any] = {}
+
+        parameters = []
+        for parameter in signature.parameters.values():
+            default = parameter.empty
+            if parameter.default is not parameter.empty:
+                namespace[f"_default_{parameter.name}"] = parameter.default
+                default = _Source(f"_default_{parameter.name}")
+
+            parameters.append(parameter.replace(default=default, annotation=parameter.empty))
+
+        unknown = set(self.param_names) - signature.parameters.keys()
+        if unknown:
+            msg = f"{func.__qualname__} has no parameters {', '.join(sorted(unknown))}"
+            raise ValueError(msg)
+
+        # Same keys as build_key(*values) with None values left out
+        source = (
+            f"def key_builder{signature.replace(parameters=parameters, return_annotation=signature.empty)}:\n"
+            f"    return ':'.join([str(value) for value in ({''.join(f'{name}, ' for name in self.param_names)})"
+            " if value is not None]) + ':'\n"
+        )
+        exec(source, namespace)  # noqa: S102
+
+        key_builder = namespace["key_builder"]
+        key_builder.__qualname__ = f"{func.__qualname__}.key_builder"
         return key_builder
 
-    return factory
+
+class _Source:
+    """Default value placeholder rendered as the name it is bound to in generated source."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+def build_key_with_defaults(*param_names: str) -> KeyBuilderFactory:
+    """Create a key builder factory that fills in default parameter values."""
+    return KeyBuilderFactory(*param_names)
 
 
 async def set_redis_value(
@@ -68,51 +214,507 @@ def cached(
     ttl: int | timedelta = DEFAULT_TTL,
     namespace: str = "main",
     cache: Redis = redis_client,
-    key_builder: Callable[..., str] | Callable[[Callable], Callable[..., str]] = build_key,
+    key_builder: Callable[..., str] | KeyBuilderFactory = build_key,
     serializer: AbstractSerializer | None = None,
+    *,
+    versioned: bool = False,
+    version_depth: int = 0,
+    local_ttl: int | None = None,
+    lock_timeout: float | None = None,
+    soft_ttl: int | None = None,
+    early_refresh: float | None = None,
 ) -> Callable:
-    """Cache the functions return value into a key generated with module_name, function_name and args."""
+    """Cache the functions return value into a key generated with module_name, function_name and args.
+
+    Versioned entries are tagged with generation counters instead of being deleted on invalidation:
+    the function counter (and the counter of the first version_depth key components, if set) is read
+    together with the entry in one MGET, and an entry with an outdated tag is treated as a miss.
+    Outdated entries are left to expire by TTL.
+
+    With local_ttl set, values are also kept in the in-process local cache for that many seconds.
+    Invalidations are published to other instances, so local_ttl only bounds staleness when
+    a message is lost.
+
+    Concurrent misses of the same key within the process share a single recomputation.
+    With lock_timeout set, a Redis lock held for at most that many seconds also stops other
+    instances from recomputing it: they serve the outdated generation if there is one,
+    or wait for the lock holder to store the entry.
+
+    With soft_ttl set, entries older than soft_ttl (and entries of an outdated generation) are
+    still served until ttl expires them, while a background task recomputes them. With
+    early_refresh set, entries are refreshed before they turn stale with a probability growing
+    as expiration nears and with the time the last recomputation took (XFetch); the value scales
+    how early, 1.0 being the usual choice.
+
+    Hits, misses, Redis latencies, recomputation times, payload sizes and invalidations
+    are counted per function in bot.cache.metrics.registry.
+
+    Calls whose first argument is a session with an uncommitted invalidation of the entry
+    (see bot.cache.invalidation) bypass the cache, so a transaction reads its own writes.
+    """
     if serializer is None:
         serializer = PickleSerializer()
 
     def decorator(func: Callable) -> Callable:
-        # If key_builder is a factory (returns a callable when called with func), use it
-        # Otherwise, use key_builder directly
-        try:
-            # Try calling key_builder with func - if it returns a callable, it's a factory
-            test_result = key_builder(func)
-            actual_key_builder = test_result if callable(test_result) else key_builder
-        except (TypeError, ValueError):
-            # If calling with func fails, it's not a factory, use it directly
-            actual_key_builder = key_builder
+        actual_key_builder = key_builder(func) if isinstance(key_builder, KeyBuilderFactory) else key_builder
+
+        # Entries of an older serializer version live under other keys and expire by TTL
+        version = f"@{serializer.version}" if serializer.version else ""
+
+        spec = CacheSpec(
+            cache=cache,
+            namespace=namespace,
+            prefix=f"{namespace}:{func.__module__}:{func.__name__}{version}",
+            generation_key=f"{namespace}:generation:{func.__module__}:{func.__name__}",
+            lock_prefix=f"{namespace}:lock:{func.__module__}:{func.__name__}",
+            key_builder=actual_key_builder,
+            ttl=ttl,
+            serializer=serializer,
+            versioned=versioned,
+            version_depth=version_depth,
+            key_size=get_key_size(func, actual_key_builder),
+            local_ttl=local_ttl,
+            lock_timeout=lock_timeout,
+            soft_ttl=soft_ttl,
+            early_refresh=early_refresh,
+            metrics=get_metrics(f"{func.__module__}.{func.__name__}"),
+        )
 
         @wraps(func)
         async def wrapper(*args: Any, **kwargs: Any) -> Any:
             key = actual_key_builder(*args, **kwargs)
-            key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
+
+            # The transaction changed what is cached, but the entry is only invalidated on commit
+            if args and _is_invalidated(args[0], f"{spec.prefix}:{key}"):
+                spec.metrics.bypasses += 1
+                return await func(*args, **kwargs)
+
+            # Check the local cache first, it costs no round trip
+            payload = _get_local(spec, key)
+            if payload is not None:
+                return serializer.deserialize(payload)
 
             # Check if the key is in the cache
-            cached_value = await cache.get(key)
-            if cached_value is not None:
-                return serializer.deserialize(cached_value)
+            entry = await _read_entry(spec, key)
+            if entry.payload is not None:
+                spec.metrics.redis_hits += 1
+                if entry.refresh:
+                    spec.metrics.stale_hits += 1
+                    _schedule_refresh(spec, key, entry, func, args, kwargs)
+                elif spec.local_ttl:
+                    local_cache.set(f"{spec.prefix}:{key}", entry.payload, spec.local_ttl, since=entry.epoch)
+                return serializer.deserialize(entry.payload)
+
+            spec.metrics.redis_misses += 1
 
             # If not in cache, call the original function
-            result = await func(*args, **kwargs)
+            return await _load(spec, key, entry, func, args, kwargs)
+
+        wrapper.cache_spec = spec  # pyright: ignore[reportAttributeAccessIssue]
+
+        return wrapper
+
+    return decorator
 
-            # Store the result in Redis
-            await set_redis_value(
-                key=key,
-                value=serializer.serialize(result),
-                ttl=ttl,
-            )
 
-            return result
+def cached_many(
+    single: Callable,
+    default: Any = None,
+) -> Callable:
+    """Cache a batch variant of a cached function under the same per-id entries.
+
+    The single function must take (session, id) and build its key with build_key(id).
+    The decorated function takes (session, ids) and returns a mapping of the ids it found
+    to their values; ids missing from it get the default. All entries are read with one MGET,
+    the function is called once with the missing ids only, and they are stored in one pipeline.
+    """
+    spec: CacheSpec = single.cache_spec  # pyright: ignore[reportAttributeAccessIssue]
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(session: AsyncSession, ids: Iterable[Hashable]) -> dict[Any, Any]:
+            keys = {item_id: build_key(item_id) for item_id in ids}
+            if any(_is_invalidated(session, f"{spec.prefix}:{key}") for key in keys.values()):
+                spec.metrics.bypasses += len(keys)
+                found = await func(session, list(keys))
+                return {item_id: found.get(item_id, default) for item_id in keys}
+
+            values = _get_local_many(spec, keys)
+
+            remaining = {item_id: key for item_id, key in keys.items() if item_id not in values}
+            entries = await _read_entries(spec, list(remaining.values()))
+
+            missing_ids = []
+            for item_id, key in remaining.items():
+                entry = entries[key]
+                if entry.payload is None:
+                    spec.metrics.redis_misses += 1
+                    missing_ids.append(item_id)
+                    continue
+
+                spec.metrics.redis_hits += 1
+                if entry.refresh:
+                    spec.metrics.stale_hits += 1
+                    _schedule_refresh(spec, key, entry, single.__wrapped__, (session, item_id), {})  # pyright: ignore[reportAttributeAccessIssue]
+                elif spec.local_ttl:
+                    local_cache.set(f"{spec.prefix}:{key}", entry.payload, spec.local_ttl, since=entry.epoch)
+
+                values[item_id] = spec.serializer.deserialize(entry.payload)
+
+            if missing_ids:
+                found = await measure(spec.metrics.recompute, func(session, missing_ids))
+                values.update({item_id: found.get(item_id, default) for item_id in missing_ids})
+
+                async with spec.cache.pipeline(transaction=False) as pipeline:
+                    for item_id in missing_ids:
+                        key = keys[item_id]
+                        payload = spec.serializer.serialize(values[item_id])
+                        entry = entries[key]
+                        await _queue_entry(pipeline, spec, key, entry.tag, payload, since=entry.epoch)
+
+                    await measure(spec.metrics.redis_set, pipeline.execute())
+
+            return values
 
         return wrapper
 
     return decorator
 
 
+def _is_invalidated(session: Any, full_key: str) -> bool:
+    """Whether the session has an uncommitted invalidation of the entry under the full key."""
+    if not isinstance(session, AsyncSession):
+        return False
+
+    batch = session.info.get(PENDING_INVALIDATIONS)
+    return batch is not None and batch.covers(full_key)
+
+
+def _get_local(spec: CacheSpec, key: str) -> bytes | None:
+    if not spec.local_ttl:
+        return None
+
+    payload = local_cache.get(f"{spec.prefix}:{key}")
+    if payload is not None:
+        spec.metrics.local_hits += 1
+    else:
+        spec.metrics.local_misses += 1
+
+    return payload
+
+
+def _get_local_many(spec: CacheSpec, keys: dict[Any, str]) -> dict[Any, Any]:
+    if not spec.local_ttl:
+        return {}
+
+    values = {}
+    for item_id, key in keys.items():
+        payload = local_cache.get(f"{spec.prefix}:{key}")
+        if payload is not None:
+            values[item_id] = spec.serializer.deserialize(payload)
+
+    spec.metrics.local_hits += len(values)
+    spec.metrics.local_misses += len(keys) - len(values)
+
+    return values
+
+
+async def _read_entries(spec: CacheSpec, keys: list[str]) -> dict[str, CacheEntry]:
+    """Read several entries of a function with a single MGET."""
+    if not keys:
+        return {}
+
+    full_keys = [f"{spec.prefix}:{key}" for key in keys]
+    epoch = local_cache.epoch
+
+    if not spec.versioned:
+        cached_values = await measure(spec.metrics.redis_get, spec.cache.mget(*full_keys))
+        return {
+            key: replace(_parse_entry(spec, b"", value), epoch=epoch)
+            for key, value in zip(keys, cached_values, strict=True)
+        }
+
+    # Generation counters shared by several keys are fetched once
+    generation_keys = {key: spec.build_generation_keys(key) for key in keys}
+    unique_generation_keys = list(dict.fromkeys(chain.from_iterable(generation_keys.values())))
+
+    response = await measure(spec.metrics.redis_get, spec.cache.mget(*unique_generation_keys, *full_keys))
+    generations = dict(zip(unique_generation_keys, response, strict=False))
+    cached_values = response[len(unique_generation_keys) :]
+
+    return {
+        key: replace(
+            _parse_entry(spec, _build_tag([generations[name] for name in generation_keys[key]]), value),
+            epoch=epoch,
+        )
+        for key, value in zip(keys, cached_values, strict=True)
+    }
+
+
+async def _read_entry(spec: CacheSpec, key: str) -> CacheEntry:
+    """Read the entry stored under the key along with the tag a fresh entry must carry."""
+    full_key = f"{spec.prefix}:{key}"
+    epoch = local_cache.epoch
+
+    if spec.versioned:
+        # Generations and the entry are fetched in a single round trip
+        *generations, cached_value = await measure(
+            spec.metrics.redis_get,
+            spec.cache.mget(*spec.build_generation_keys(key), full_key),
+        )
+        return replace(_parse_entry(spec, _build_tag(generations), cached_value), epoch=epoch)
+
+    cached_value = await measure(spec.metrics.redis_get, spec.cache.get(full_key))
+    return replace(_parse_entry(spec, b"", cached_value), epoch=epoch)
+
+
+def _build_tag(generations: list[bytes | None]) -> bytes:
+    return b".".join(generation or b"0" for generation in generations)
+
+
+def _parse_entry(spec: CacheSpec, tag: bytes, cached_value: bytes | None) -> CacheEntry:
+    """Split a stored value into its header and payload and decide how it can be served."""
+    if cached_value is None:
+        return CacheEntry(tag=tag)
+
+    *header, payload = cached_value.split(HEADER_SEPARATOR, spec.header_size)
+
+    # Entries written before the function's cache options changed are treated as missing
+    if len(header) != spec.header_size:
+        return CacheEntry(tag=tag)
+
+    if spec.versioned and header[0] != tag:
+        if spec.soft_ttl is not None:
+            return CacheEntry(tag=tag, payload=payload, refresh=True)
+
+        return CacheEntry(tag=tag, stale=payload)
+
+    try:
+        refresh = spec.timed and _should_refresh(spec, fresh_until=float(header[-2]), delta=float(header[-1]))
+    except ValueError:
+        return CacheEntry(tag=tag)
+
+    return CacheEntry(tag=tag, payload=payload, refresh=refresh)
+
+
+def _should_refresh(spec: CacheSpec, fresh_until: float, delta: float) -> bool:
+    now = time.time()
+
+    if spec.early_refresh is not None:
+        # XFetch: -log(U) is exponentially distributed, so refreshes of a key spread out before expiration
+        now -= delta * spec.early_refresh * math.log(1 - random.random())  # noqa: S311
+
+    return now >= fresh_until
+
+
+def _schedule_refresh(
+    spec: CacheSpec,
+    key: str,
+    entry: CacheEntry,
+    func: Callable,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> None:
+    full_key = f"{spec.prefix}:{key}"
+    if full_key in _refreshing or full_key in _inflight:
+        return
+
+    _refreshing.add(full_key)
+
+    task = asyncio.create_task(_refresh(spec, key, entry, func, args, kwargs))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _refresh(
+    spec: CacheSpec,
+    key: str,
+    entry: CacheEntry,
+    func: Callable,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> None:
+    full_key = f"{spec.prefix}:{key}"
+
+    try:
+        # The caller's session is closed with its update, so the refresh gets its own
+        async with sessionmaker() as session:
+            args = tuple(session if isinstance(arg, AsyncSession) else arg for arg in args)
+            kwargs = {name: session if isinstance(arg, AsyncSession) else arg for name, arg in kwargs.items()}
+
+            # Another instance holding the lock is already refreshing: keep serving the current payload
+            stale_entry = CacheEntry(tag=entry.tag, stale=entry.payload, epoch=entry.epoch)
+            await _load(spec, key, stale_entry, func, args, kwargs)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"failed to refresh cache entry {full_key}: {e}")
+    finally:
+        _refreshing.discard(full_key)
+
+
+async def _load(
+    spec: CacheSpec,
+    key: str,
+    entry: CacheEntry,
+    func: Callable,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> Any:
+    """Recompute a missing entry, coalescing concurrent misses of the same key."""
+    full_key = f"{spec.prefix}:{key}"
+
+    inflight = _inflight.get(full_key)
+    if inflight is not None:
+        await asyncio.wait([inflight])
+
+        # If the leading call was cancelled, this one recomputes instead
+        if not inflight.cancelled():
+            return spec.serializer.deserialize(inflight.result())
+
+    future: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+    _inflight[full_key] = future
+
+    try:
+        result, payload = await _recompute(spec, key, entry, func, args, kwargs)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # the leading call re-raises it, so don't report it as unretrieved
+        raise
+    else:
+        future.set_result(payload)
+        return result
+    finally:
+        if _inflight.get(full_key) is future:
+            del _inflight[full_key]
+
+
+async def _recompute(
+    spec: CacheSpec,
+    key: str,
+    entry: CacheEntry,
+    func: Callable,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> tuple[Any, bytes]:
+    if spec.lock_timeout is None:
+        return await _compute(spec, key, entry, func, args, kwargs)
+
+    lock = spec.cache.lock(f"{spec.lock_prefix}:{key}", timeout=spec.lock_timeout, blocking=False)
+    if await lock.acquire():
+        try:
+            return await _compute(spec, key, entry, func, args, kwargs)
+        finally:
+            # The lock may have expired while computing
+            with suppress(LockError):
+                await lock.release()
+
+    payload = entry.stale or await _wait_for_entry(spec, key)
+    if payload is None:
+        # The lock holder did not store the entry in time
+        return await _compute(spec, key, entry, func, args, kwargs)
+
+    return spec.serializer.deserialize(payload), payload
+
+
+async def _compute(
+    spec: CacheSpec,
+    key: str,
+    entry: CacheEntry,
+    func: Callable,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> tuple[Any, bytes]:
+    started_at = time.perf_counter()
+    result = await func(*args, **kwargs)
+    delta = time.perf_counter() - started_at
+    spec.metrics.recompute.observe(delta)
+
+    payload = spec.serializer.serialize(result)
+    await _write_entry(spec, key, entry.tag, payload, delta=delta, since=entry.epoch)
+
+    return result, payload
+
+
+async def _wait_for_entry(spec: CacheSpec, key: str) -> bytes | None:
+    """Poll for the entry another instance is computing until its lock would expire."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (spec.lock_timeout or 0)
+
+    while loop.time() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+        entry = await _read_entry(spec, key)
+        if entry.payload is not None:
+            return entry.payload
+
+    return None
+
+
+async def _write_entry(
+    spec: CacheSpec,
+    key: str,
+    tag: bytes,
+    payload: bytes,
+    delta: float = 0.0,
+    since: int | None = None,
+) -> None:
+    async with spec.cache.pipeline(transaction=False) as pipeline:
+        await _queue_entry(pipeline, spec, key, tag, payload, delta, since)
+        await measure(spec.metrics.redis_set, pipeline.execute())
+
+
+async def _queue_entry(
+    pipeline: Pipeline,
+    spec: CacheSpec,
+    key: str,
+    tag: bytes,
+    payload: bytes,
+    delta: float = 0.0,
+    since: int | None = None,
+) -> None:
+    """Add the commands storing an entry to the pipeline and keep the entry locally.
+
+    With since set to the local cache epoch read before the entry's tag, the entry isn't
+    kept locally if the key was invalidated meanwhile: it was computed for an older generation.
+    """
+    full_key = f"{spec.prefix}:{key}"
+    spec.metrics.payload_size.observe(len(payload))
+
+    # An entry computed while the generation was bumped keeps the old tag and is never served fresh
+    header = [tag] if spec.versioned else []
+
+    if spec.timed:
+        fresh_for = spec.soft_ttl if spec.soft_ttl is not None else _total_seconds(spec.ttl)
+        header += [f"{time.time() + fresh_for:.3f}".encode(), f"{delta:.3f}".encode()]
+
+    await pipeline.set(full_key, HEADER_SEPARATOR.join([*header, payload]))
+    if spec.ttl:
+        await pipeline.expire(full_key, spec.ttl)
+
+    if spec.local_ttl:
+        local_cache.set(full_key, payload, spec.local_ttl, since=since)
+
+
+def _total_seconds(ttl: int | timedelta) -> float:
+    return ttl.total_seconds() if isinstance(ttl, timedelta) else ttl
+
+
+async def refresh_cache(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Recompute the entry of a cached function for the arguments and store it.
+
+    Unlike a call, this recomputes even if a fresh entry is cached, so it can keep hot entries
+    from ever turning stale. A recomputation of the same key already running is joined instead.
+    """
+    spec: CacheSpec = func.cache_spec  # pyright: ignore[reportAttributeAccessIssue]
+    key = spec.key_builder(*args, **kwargs)
+
+    entry = await _read_entry(spec, key)
+    stale_entry = CacheEntry(entry.tag, stale=entry.payload, epoch=entry.epoch)
+    return await _load(spec, key, stale_entry, func.__wrapped__, args, kwargs)  # pyright: ignore[reportAttributeAccessIssue]
+
+
 async def clear_cache(
     func: Callable,
     *args: Any,
@@ -123,7 +725,22 @@ async def clear_cache(
 
     If an argument or keyword argument is not provided, it will be treated as a wildcard,
     matching all cache entries regardless of that parameter's value.
+
+    For versioned functions this never scans the keyspace: without arguments the function
+    generation is bumped, with at least version_depth arguments the generation of that prefix
+    is bumped, and otherwise the arguments must address a single entry, which is deleted.
+
+    Raises:
+        ValueError: If the arguments of a versioned function address none of these.
+
     """
+    spec: CacheSpec | None = getattr(func, "cache_spec", None)
+    if spec is not None:
+        async with spec.cache.pipeline(transaction=False) as pipeline:
+            await queue_invalidation(pipeline, spec, args, kwargs)
+            await pipeline.execute()
+        return
+
     # Build partial key from only the provided args/kwargs
     partial_key = build_key(*args, **kwargs)
 
@@ -139,3 +756,73 @@ async def clear_cache(
     # Delete all matching keys
     if matching_keys:
         await redis_client.delete(*matching_keys)
+
+
+def invalidation_prefix(spec: CacheSpec, args: tuple[Any, ...], kwargs: dict[str, Any]) -> str:
+    """Return the prefix of all keys an invalidation with the arguments affects.
+
+    Raises:
+        ValueError: If the function is versioned and the arguments address neither every
+            entry, nor a version_depth prefix, nor a single entry.
+
+    """
+    if not args and not kwargs:
+        return f"{spec.prefix}:"
+    if spec.versioned and spec.version_depth and len(args) >= spec.version_depth:
+        return f"{spec.prefix}:{build_key(*args[: spec.version_depth])}"
+    if spec.versioned and spec.key_size is not None and len(args) + len(kwargs) != spec.key_size:
+        # Deleting the key they build would leave every entry under it in place
+        expected = f"at least {spec.version_depth} or {spec.key_size}" if spec.version_depth else spec.key_size
+        msg = f"invalidations of {spec.prefix} take no arguments or {expected}, not {len(args) + len(kwargs)}"
+        raise ValueError(msg)
+    return f"{spec.prefix}:{build_key(*args, **kwargs)}"
+
+
+async def queue_invalidation(
+    pipeline: Pipeline,
+    spec: CacheSpec,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> str:
+    """Queue the commands invalidating entries of a cached function, returning the affected prefix.
+
+    The local cache is invalidated right away, other instances once the pipeline is executed.
+    """
+    prefix = invalidation_prefix(spec, args, kwargs)
+    spec.metrics.invalidations += 1
+
+    if not spec.versioned:
+        # Unversioned entries can only be found by scanning the keyspace
+        matching_keys = [key async for key in spec.cache.scan_iter(match=f"{prefix}*")]
+        if matching_keys:
+            await pipeline.delete(*matching_keys)
+    elif not args and not kwargs:
+        await pipeline.incr(spec.generation_key)
+    elif spec.version_depth and len(args) >= spec.version_depth:
+        await pipeline.incr(f"{spec.generation_key}:{build_key(*args[: spec.version_depth])}")
+    else:
+        await pipeline.delete(prefix)
+
+    if spec.local_ttl:
+        local_cache.invalidate(prefix)
+        await pipeline.publish(INVALIDATION_CHANNEL, prefix)
+
+    return prefix
+
+
+async def listen_invalidations(cache: Redis = redis_client) -> None:
+    """Drop local cache entries invalidated by other instances until cancelled."""
+    while True:
+        try:
+            async with cache.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                # Invalidations published while not subscribed are lost
+                local_cache.clear()
+
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        local_cache.invalidate(message["data"].decode())
+        except RedisError as e:
+            logger.warning(f"cache invalidation listener disconnected: {e}")
+            await asyncio.sleep(1)
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 import pickle
+import zlib
 from abc import ABC, abstractmethod
-from typing import Any
+from dataclasses import make_dataclass
+from datetime import datetime
+from functools import cache
+from typing import TYPE_CHECKING, Any
 
 import orjson
+from sqlalchemy import DateTime
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.hybrid import hybrid_property
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import DeclarativeBase
 
 
 class AbstractSerializer(ABC):
+    # Part of the cache keys, changed whenever payloads written before can't be deserialized
+    version: str = ""
 
     @abstractmethod
     def serialize(self, obj: Any) -> Any:
@@ -33,3 +45,107 @@ class JSONSerializer(AbstractSerializer):
 
     def deserialize(self, obj: str) -> Any:
         return orjson.loads(obj)
+
+
+class ModelSerializer(AbstractSerializer):
+    """Serialize ORM models as their column values only, using JSON.
+
+    Models are rebuilt as read-only snapshots exposing the same columns and hybrid properties,
+    which don't depend on the mapper state. Values JSON can't represent are pickled instead.
+    """
+
+    MARKER = b"M"
+    MODEL_KEY = "__m"
+    VALUES_KEY = "__v"
+    TUPLE_KEY = "__t"
+
+    def __init__(self, *models: type[DeclarativeBase]) -> None:
+        self.__models = {model.__tablename__: model for model in models}
+
+        # Values are stored by position, so payloads are tied to the columns of the models
+        columns = [f"{table}.{column.key}" for table, model in self.__models.items() for column in model.__table__.c]
+        self.version = f"{zlib.crc32(",".join(columns).encode()):08x}"
+
+    def serialize(self, obj: Any) -> bytes:
+        try:
+            return self.MARKER + orjson.dumps(self.__encode(obj))
+        except TypeError:
+            return pickle.dumps(obj)
+
+    def deserialize(self, obj: bytes) -> Any:
+        if obj[:1] != self.MARKER:
+            return pickle.loads(obj)  # noqa: S301
+
+        return self.__decode(orjson.loads(obj[1:]))
+
+    def __encode(self, obj: Any) -> Any:
+        if isinstance(obj, list):
+            return [self.__encode(item) for item in obj]
+
+        if isinstance(obj, tuple):
+            return {self.TUPLE_KEY: [self.__encode(item) for item in obj]}
+
+        if isinstance(obj, dict):
+            return {key: self.__encode(value) for key, value in obj.items()}
+
+        table_name = getattr(obj, "__tablename__", None)
+        if table_name in self.__models:
+            columns = self.__models[table_name].__table__.columns.keys()
+            return {self.MODEL_KEY: table_name, self.VALUES_KEY: [getattr(obj, column) for column in columns]}
+
+        return obj
+
+    def __decode(self, obj: Any) -> Any:
+        if isinstance(obj, list):
+            return [self.__decode(item) for item in obj]
+
+        if not isinstance(obj, dict):
+            return obj
+
+        if self.TUPLE_KEY in obj:
+            return tuple(self.__decode(item) for item in obj[self.TUPLE_KEY])
+
+        if self.MODEL_KEY in obj:
+            model = self.__models[obj[self.MODEL_KEY]]
+            snapshot_class, datetime_columns = get_snapshot_class(model)
+            values = [
+                datetime.fromisoformat(value) if index in datetime_columns and value is not None else value
+                for index, value in enumerate(obj[self.VALUES_KEY])
+            ]
+            return snapshot_class(*values)
+
+        return {key: self.__decode(value) for key, value in obj.items()}
+
+
+@cache
+def get_snapshot_class(model: type[DeclarativeBase]) -> tuple[type, frozenset[int]]:
+    """Build a frozen dataclass mirroring the model's columns and hybrid properties.
+
+    Returns:
+        The snapshot class and positions of its datetime columns.
+
+    """
+    columns = list(model.__table__.columns)
+
+    namespace = {
+        name: property(descriptor.fget)
+        for name, descriptor in sa_inspect(model).all_orm_descriptors.items()
+        if isinstance(descriptor, hybrid_property)
+    }
+    namespace["__repr__"] = model.__repr__
+
+    snapshot_class = make_dataclass(
+        f"{model.__name__}Snapshot",
+        [column.key for column in columns],
+        namespace=namespace,
+        frozen=True,
+        slots=True,
+        repr=False,
+    )
+    snapshot_class.__tablename__ = model.__tablename__  # type: ignore[attr-defined]
+    snapshot_class.__table__ = model.__table__  # type: ignore[attr-defined]
+    snapshot_class.repr_cols = getattr(model, "repr_cols", ())  # type: ignore[attr-defined]
+    snapshot_class.repr_cols_num = getattr(model, "repr_cols_num", 0)  # type: ignore[attr-defined]
+
+    datetime_columns = frozenset(index for index, column in enumerate(columns) if isinstance(column.type, DateTime))
+    return snapshot_class, datetime_columns
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+
+from bot.cache.redis import refresh_cache
+from bot.core.loader import sessionmaker, settings
+from bot.dialogs.top.constants import TRACKS_PER_PAGE
+from bot.services import track as track_service
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.database.models import TrackModel
+
+
+async def warm_up_cache(bot: Bot, pages: int, *, refresh: bool = False) -> None:
+    """Precompute the reads of the first pages of /top and the bot's own user.
+
+    Cached values are read through, so only missing entries are computed. With refresh set,
+    the entries are recomputed even if cached, keeping them from turning stale.
+    """
+    # Bot.me() keeps the user for the lifetime of the bot
+    await bot.me()
+
+    try:
+        async with sessionmaker() as session:
+            # The Redis leaderboard is never stale, only the tracks on its pages are cached, and
+            # pages of the top_tracks view are recomputed when the view is refreshed
+            if refresh and settings.leaderboard.backend == "postgres":
+                await _refresh_top(session, pages)
+            else:
+                await _read_top(session, pages)
+    except (RedisError, SQLAlchemyError) as e:
+        logger.exception(f"Failed to warm up cache: {e}")
+
+
+async def _read_top(session: AsyncSession, pages: int) -> None:
+    """Read the top the way the top dialog does, the first page by offset, the next by cursor."""
+    after = None
+    for page in range(pages):
+        tracks, _ = await track_service.get_top_page(
+            session,
+            limit=TRACKS_PER_PAGE,
+            offset=page * TRACKS_PER_PAGE,
+            after=after,
+        )
+        if len(tracks) < TRACKS_PER_PAGE:
+            return
+
+        after = _get_cursor(tracks)
+
+
+async def _refresh_top(session: AsyncSession, pages: int) -> None:
+    """Recompute the cache entries _read_top reads from Postgres."""
+    tracks, _ = await refresh_cache(track_service.get_tracks_page_by_votes, session, limit=TRACKS_PER_PAGE)
+    for _ in range(1, pages):
+        if len(tracks) < TRACKS_PER_PAGE:
+            return
+
+        vote_count, track_id = _get_cursor(tracks)
+        tracks, _ = await refresh_cache(
+            track_service.get_tracks_page_by_votes,
+            session,
+            limit=TRACKS_PER_PAGE,
+            vote_count=vote_count,
+            track_id=track_id,
+        )
+
+
+def _get_cursor(tracks: list[tuple[TrackModel, int]]) -> list[int]:
+    last_track, last_vote_count = tracks[-1]
+    return [last_vote_count, last_track.id]
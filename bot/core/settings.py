@@ -1,6 +1,17 @@
 from __future__ import annotations
 
-from pydantic import DirectoryPath, NonNegativeFloat, NonNegativeInt, PositiveInt, SecretStr, computed_field
+from typing import Literal
+
+from pydantic import (
+    DirectoryPath,
+    Field,
+    NonNegativeFloat,
+    NonNegativeInt,
+    PositiveFloat,
+    PositiveInt,
+    SecretStr,
+    computed_field,
+)
 from pydantic_settings import BaseSettings as PydanticBaseSettings
 from pydantic_settings import SettingsConfigDict
 
@@ -47,11 +58,56 @@ class LastFmSettings(BaseSettings):
     app_name: str
 
 
+class LeaderboardSettings(BaseSettings):
+    # Where the top is read from: tracks in Postgres, the sorted sets kept in Redis,
+    # or the top_tracks materialized view
+    backend: Literal["postgres", "redis", "view"] = "postgres"
+    # Seconds between rebuilds of the Redis leaderboard and reconciles of the trending scores
+    reconcile_interval: PositiveInt = 60 * 60
+    # Seconds between checks whether the top changed, refreshing the view if it did
+    view_refresh_interval: PositiveInt = 10
+    # Offer the trending top next to the all-time one, keeping its scores in Redis
+    trending: bool = True
+    # Seconds after which a vote counts half as much as a new one in the trending top
+    trending_half_life: PositiveInt = 24 * 60 * 60
+
+
+class VotesSettings(BaseSettings):
+    # Acknowledge votes once appended to a Redis stream and insert them into Postgres in batches
+    buffered: bool = False
+    # Most votes inserted by one statement
+    batch_size: PositiveInt = 500
+    # Seconds the writer waits for more votes after a partial batch
+    flush_interval: PositiveFloat = 0.2
+    # Seconds a vote that failed to be inserted stays pending before it's retried
+    retry_interval: PositiveInt = 30
+    # Deliveries of a vote to writers before it's moved to the dead-letter stream
+    max_attempts: PositiveInt = 5
+
+
+class SearchSettings(BaseSettings):
+    # Where tracks are searched: the in-process trigram index or Postgres
+    engine: Literal["memory", "postgres"] = "memory"
+    # Seconds between reloads of the in-process index, picking up changes made by other instances
+    reload_interval: PositiveInt = 10 * 60
+
+
+class CacheSettings(BaseSettings):
+    # Pages of the top precomputed on startup and kept fresh by the scheduler
+    warmup_pages: NonNegativeInt = 3
+    # Seconds between refreshes, shorter than the soft TTL of the top, so readers never see it stale
+    warmup_interval: PositiveInt = 4 * 60
+
+
 class Settings(BaseSettings):
     bot: BotSettings
     file_log: FileLogSettings
     postgres: PostgresSettings
     redis: RedisSettings
     last_fm: LastFmSettings
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    leaderboard: LeaderboardSettings = Field(default_factory=LeaderboardSettings)
+    votes: VotesSettings = Field(default_factory=VotesSettings)
+    search: SearchSettings = Field(default_factory=SearchSettings)
 
     model_config = SettingsConfigDict(env_nested_delimiter="__")
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 from .base import Base
+from .top_track import TopTrackModel
 from .track import TrackModel
 from .user import UserModel
 from .vote import VoteModel
 
 __all__ = [
     "Base",
+    "TopTrackModel",
     "TrackModel",
     "UserModel",
     "VoteModel",
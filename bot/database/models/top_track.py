@@ -0,0 +1,21 @@
+from sqlalchemy import BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.database.models.base import Base
+
+
+class TopTrackModel(Base):
+    """Row of the top_tracks materialized view, refreshed by the scheduler."""
+
+    __tablename__ = "top_tracks"
+    # Created by a migration as a view, autogenerate must not treat it as a table
+    __table_args__ = {"info": {"is_view": True}}  # noqa: RUF012
+
+    track_id: Mapped[int] = mapped_column(primary_key=True)
+    vote_count: Mapped[int]
+    is_used: Mapped[bool]
+    # Position among tracks with the same is_used, starting at 1
+    rank: Mapped[int] = mapped_column(BigInteger)
+
+    repr_cols = ("track_id", "vote_count", "rank")
+    repr_cols_num = 4
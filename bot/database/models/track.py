@@ -1,6 +1,6 @@
 from typing import Any
 
-from sqlalchemy import UniqueConstraint, case, or_
+from sqlalchemy import Text, UniqueConstraint, case, or_, text
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import expression
@@ -16,6 +16,11 @@ class TrackModel(TimestampMixin, Base):
     title: Mapped[str_255]
     tiktok_url: Mapped[str_255 | None] = mapped_column(server_default=expression.null())
     youtube_url: Mapped[str_255 | None] = mapped_column(server_default=expression.null())
+    # Maintained by a trigger on votes, the default only fills new instances without a reload
+    vote_count: Mapped[int] = mapped_column(default=0, server_default=text("0"))
+    # normalize() of the artist and the title, set with them by the track service and searched instead
+    artist_search_key: Mapped[str] = mapped_column(Text)
+    title_search_key: Mapped[str] = mapped_column(Text)
 
     repr_cols = ("id", "title", "artist")
     repr_cols_num = 3
@@ -48,7 +48,10 @@ suggest_dialog = Dialog(
         getter=getters.get_existing_done_track_data,
     ),
     Window(
-        Jinja("<b>{{ artist }} - {{ title }}\n</b>У трека <b>{{ votes_count }}</b> ⭐️"),
+        Jinja(
+            "<b>{{ artist }} - {{ title }}\n</b>У трека <b>{{ votes_count }}</b> ⭐️"
+            "{% if rank %}\n<b>#{{ rank }}</b> в топе{% endif %}"
+        ),
         Column(
             Button(
                 Const("Проголосовать за трек ⭐️"),
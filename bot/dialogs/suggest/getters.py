@@ -50,6 +50,7 @@ async def get_existing_not_done_track_data(
         "artist": "",
         "title": "",
         "votes_count": 0,
+        "rank": "",
     }
 
     track = await track_service.get_track_by_id(session, track_id)
@@ -60,6 +61,7 @@ async def get_existing_not_done_track_data(
     data["artist"] = track.artist
     data["title"] = track.title
     data["votes_count"] = await vote_service.get_votes_count_by_track(session, track_id)
+    data["rank"] = await track_service.get_track_rank(session, track_id) or ""
 
     return data
 
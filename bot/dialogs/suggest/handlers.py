@@ -140,6 +140,7 @@ async def handle_vote_for_existing_track_button_click(
         return None
 
     await send_vote_success_message(
+        session,
         message=event.message,
         track_id=track_id,
         artist=artist,
@@ -149,7 +150,7 @@ async def handle_vote_for_existing_track_button_click(
     return await dialog_manager.done()
 
 
-async def handle_new_track_select(  # noqa: PLR0911
+async def handle_new_track_select(
     event: CallbackQuery,
     select: Select[int],
     dialog_manager: DialogManager,
@@ -159,65 +160,34 @@ async def handle_new_track_select(  # noqa: PLR0911
     track_data: Track = Track.model_validate(dialog_manager.dialog_data["tracks"][data])
 
     try:
-        track = await track_service.create_track(
-            session,
-            title=track_data.title,
-            artist=track_data.artist,
-        )
-    except errors.TrackAlreadyExistsError:
-        track = await track_service.get_track_by_title_and_artist(
+        result = await vote_service.create_track_and_vote(
             session,
+            user_id=event.from_user.id,
             title=track_data.title,
             artist=track_data.artist,
         )
-
-        if track is None:
-            logger.error(f"Track not found for title {track_data.title} and artist {track_data.artist}")
-            await event.answer("⚠️ Произошла ошибка", show_alert=True)
-            return None
-
-        if track.is_used:
-            return await dialog_manager.switch_to(SuggestSG.waiting_for_existing_done_track_action)
-
-        try:
-            await vote_service.create_vote(
-                session,
-                user_id=event.from_user.id,
-                track_id=track.id,
-            )
-        except errors.VoteAlreadyExistsError:
-            await event.answer("Вы уже проголосовали за этот трек", show_alert=True)
-            return await dialog_manager.done()
-        except errors.ServiceError as e:
-            logger.error(e)
-            await event.answer("⚠️ Произошла ошибка", show_alert=True)
-            return None
-
-        await send_vote_success_message(
-            message=event.message,
-            track_id=track.id,
-            artist=track.artist,
-            title=track.title,
-        )
-
-        return await dialog_manager.done()
     except errors.ServiceError as e:
         logger.error(e)
         await event.answer("⚠️ Произошла ошибка", show_alert=True)
         return None
 
-    try:
-        await vote_service.create_vote(
-            session,
-            user_id=event.from_user.id,
-            track_id=track.id,
-        )
-    except errors.ServiceError as e:
-        logger.error(e)
+    if result is None:
+        logger.error(f"Track not found for title {track_data.title} and artist {track_data.artist}")
         await event.answer("⚠️ Произошла ошибка", show_alert=True)
         return None
 
+    track = result.track
+
+    if track.is_used:
+        dialog_manager.dialog_data["track_id"] = track.id
+        return await dialog_manager.switch_to(SuggestSG.waiting_for_existing_done_track_action)
+
+    if not result.is_new_vote:
+        await event.answer("Вы уже проголосовали за этот трек", show_alert=True)
+        return await dialog_manager.done()
+
     await send_vote_success_message(
+        session,
         message=event.message,
         track_id=track.id,
         artist=track.artist,
@@ -228,16 +198,20 @@ async def handle_new_track_select(  # noqa: PLR0911
 
 
 async def send_vote_success_message(
+    session: AsyncSession,
     message: Message,
     track_id: int,
     artist: str,
     title: str,
 ) -> None:
+    rank = await track_service.get_track_rank_after_vote(session, track_id)
+    rank_text = f"\n#{rank} в топе" if rank is not None else ""
+
     text = f"""
 Вы проголосовали за трек ⭐️
-<b>{artist} - {title}</b>
+<b>{artist} - {title}</b>{rank_text}
 
 Делись ссылкой на трек, чтобы он собрал больше голосов
-<code>t.me/{(await message.bot.get_me()).username}?start=vote_{track_id}</code>
+<code>t.me/{(await message.bot.me()).username}?start=vote_{track_id}</code>
 """
     await message.answer(text)
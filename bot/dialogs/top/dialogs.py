@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from aiogram import F
 from aiogram_dialog import Dialog, Window
-from aiogram_dialog.widgets.kbd import Column, Counter, Select, Start
+from aiogram_dialog.widgets.kbd import Button, Column, Counter, Select, Start
 from aiogram_dialog.widgets.text import Case, Const, Format
 
 from bot.dialogs.top import getters, handlers
@@ -41,6 +41,18 @@ top_dialog = Dialog(
             on_value_changed=handlers.handle_page_change,
             when=F["max_pages"] > 1,
         ),
+        Button(
+            Case(
+                texts={
+                    True: Const("🏆 За всё время"),
+                    False: Const("🔥 В тренде"),
+                },
+                selector="trending",
+            ),
+            id="mode",
+            on_click=handlers.handle_mode_click,
+            when="trending_enabled",
+        ),
         Start(
             Case(
                 texts={
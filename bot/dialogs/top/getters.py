@@ -3,7 +3,9 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 
 from bot.dialogs.top.constants import TRACKS_PER_PAGE
+from bot.services import leaderboard
 from bot.services import track as track_service
+from bot.services import vote as vote_service
 
 if TYPE_CHECKING:
     from aiogram_dialog import DialogManager
@@ -15,19 +17,39 @@ if TYPE_CHECKING:
 async def get_tracks_data(
     dialog_manager: DialogManager,
     **_: Any,
-) -> dict[str, list[tuple[TrackModel, int]] | int]:
+) -> dict[str, list[tuple[TrackModel, int]] | int | bool]:
     session: AsyncSession = dialog_manager.middleware_data["session"]
     page = dialog_manager.dialog_data["page"]
-
-    tracks = await track_service.get_tracks_by_votes(
-        session,
-        limit=TRACKS_PER_PAGE,
-        offset=(page - 1) * TRACKS_PER_PAGE,
-    )
-
-    tracks_count = await track_service.get_tracks_count(session)
+    # cursors[i] is the (vote_count, track_id) of the last track before page i + 1
+    cursors: list[list[int] | None] = dialog_manager.dialog_data["cursors"]
+
+    trending: bool = dialog_manager.dialog_data["trending"]
+
+    if trending:
+        tracks, tracks_count = await vote_service.get_trending_page(
+            session,
+            limit=TRACKS_PER_PAGE,
+            offset=(page - 1) * TRACKS_PER_PAGE,
+        )
+    else:
+        tracks, tracks_count = await track_service.get_top_page(
+            session,
+            limit=TRACKS_PER_PAGE,
+            offset=(page - 1) * TRACKS_PER_PAGE,
+            after=cursors[page - 1] if page <= len(cursors) else None,
+        )
+
+        if tracks and page == len(cursors):
+            last_track, last_vote_count = tracks[-1]
+            cursors.append([last_vote_count, last_track.id])
+
+    max_pages = (tracks_count + TRACKS_PER_PAGE - 1) // TRACKS_PER_PAGE
+    # The number of pages differs between the modes
+    dialog_manager.dialog_data["max_pages"] = max_pages or 1
 
     return {
         "tracks": tracks,
-        "max_pages": (tracks_count + TRACKS_PER_PAGE - 1) // TRACKS_PER_PAGE,
+        "max_pages": max_pages,
+        "trending": trending,
+        "trending_enabled": leaderboard.is_trending_enabled(),
     }
@@ -11,8 +11,9 @@ from bot.services import vote as vote_service
 from bot.states.admin.track import AdminTrackSG
 
 if TYPE_CHECKING:
+    from aiogram.types import CallbackQuery
     from aiogram_dialog import ChatEvent, DialogManager
-    from aiogram_dialog.widgets.kbd import ManagedCounter, Select
+    from aiogram_dialog.widgets.kbd import Button, ManagedCounter, Select
     from sqlalchemy.ext.asyncio import AsyncSession
 
     from bot.core.settings import Settings
@@ -23,8 +24,11 @@ async def handle_start(
     dialog_manager: DialogManager,
 ) -> None:
     dialog_manager.dialog_data["page"] = 1
+    dialog_manager.dialog_data["cursors"] = [None]
+    dialog_manager.dialog_data["trending"] = False
     session: AsyncSession = dialog_manager.middleware_data["session"]
-    tracks_count = await track_service.get_tracks_count(session)
+    # The same cache entry the getter reads the first page from
+    _, tracks_count = await track_service.get_top_page(session, limit=TRACKS_PER_PAGE)
     dialog_manager.dialog_data["max_pages"] = (tracks_count + TRACKS_PER_PAGE - 1) // TRACKS_PER_PAGE or 1
 
 
@@ -43,6 +47,19 @@ async def handle_page_change(
     dialog_manager.dialog_data["page"] = page
 
 
+async def handle_mode_click(
+    event: CallbackQuery,
+    button: Button,
+    dialog_manager: DialogManager,
+) -> None:
+    dialog_manager.dialog_data["trending"] = not dialog_manager.dialog_data["trending"]
+    dialog_manager.dialog_data["page"] = 1
+    dialog_manager.dialog_data["cursors"] = [None]
+
+    counter: ManagedCounter = dialog_manager.find("page")  # pyright: ignore[reportAssignmentType]
+    await counter.set_value(1)
+
+
 async def handle_track_select(
     event: ChatEvent,
     select: Select[int],
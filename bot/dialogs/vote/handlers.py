@@ -57,6 +57,7 @@ async def handle_vote_button_click(
         return None
 
     await send_vote_success_message(
+        session,
         message=event.message,
         track_id=track.id,
         artist=track.artist,
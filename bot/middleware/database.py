@@ -5,6 +5,8 @@ from typing import TYPE_CHECKING, Any, TypeVar
 from aiogram import BaseMiddleware
 from loguru import logger
 
+from bot.cache.invalidation import apply_invalidations
+
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
 
@@ -29,6 +31,7 @@ class DatabaseMiddleware(BaseMiddleware):
             try:
                 result = await handler(event, data)
                 await session.commit()
+                await apply_invalidations(session)
             except Exception as e:
                 logger.exception(f"Error in database middleware: {e}")
                 await session.rollback()
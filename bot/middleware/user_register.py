@@ -43,6 +43,7 @@ class UserRegisterMiddleware(BaseMiddleware):
                 last_name=tg_user.last_name,
                 deep_link=deep_link,
             )
-            logger.info(f"user {user.id} added to database")
+            if user is not None:
+                logger.info(f"user {user.id} added to database")
 
         return await handler(event, data)
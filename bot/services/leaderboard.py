@@ -0,0 +1,428 @@
+from __future__ import annotations
+
+import math
+import time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from sqlalchemy import func, literal_column, select
+
+from bot.cache.invalidation import on_commit
+from bot.core.loader import redis_client, sessionmaker, settings
+from bot.database.models import TrackModel, VoteModel
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from redis.asyncio import Redis
+    from redis.asyncio.client import Pipeline
+    from sqlalchemy import ColumnElement, Select
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Unused and used tracks scored by their vote count, a track is a member of exactly one of them.
+# Kept unless the top is read from the top_tracks view, they rank tracks on the other backends
+TOP_KEY = "leaderboard:top"
+USED_KEY = "leaderboard:used"
+# Set once the sorted sets are built from Postgres, so an empty top is told apart from a lost one
+BUILT_KEY = "leaderboard:built"
+REBUILD_LOCK_KEY = "leaderboard:lock:rebuild"
+REBUILD_LOCK_TIMEOUT = 60
+
+# Unused and used tracks with votes scored by their trending score, maintained regardless of
+# the backend while the trending top is enabled. The score is log(sum(exp(decay * t))) over
+# the times t of the track's votes, so a vote's weight halves every half-life relative to newer
+# votes, and the scores of tracks don't need updating as time passes, only when they get votes
+TRENDING_KEY = "leaderboard:trending"
+TRENDING_USED_KEY = "leaderboard:trending:used"
+TRENDING_BUILT_KEY = "leaderboard:trending:built"
+TRENDING_REBUILD_LOCK_KEY = "leaderboard:lock:rebuild_trending"
+# Epoch seconds of the latest vote the trending scores were last computed from
+TRENDING_WATERMARK_KEY = "leaderboard:trending:watermark"
+# Seconds before the watermark votes are read again, to catch ones committed later than created
+TRENDING_RECONCILE_OVERLAP = 5 * 60
+
+# Moves a member with its score from the sorted set KEYS[1] to KEYS[2]
+_MOVE_SCRIPT = redis_client.register_script(
+    """
+    local score = redis.call("ZSCORE", KEYS[1], ARGV[1])
+    if score then
+        redis.call("ZREM", KEYS[1], ARGV[1])
+        redis.call("ZADD", KEYS[2], score, ARGV[1])
+    end
+    """,
+)
+
+
+# Adds the weight ARGV[2] of new votes to the trending score of the member ARGV[1], in the
+# sorted set KEYS[2] if it's a member there, otherwise in KEYS[1]
+_ADD_TRENDING_SCRIPT = redis_client.register_script(
+    """
+    local key = KEYS[1]
+    local score = redis.call("ZSCORE", KEYS[2], ARGV[1])
+    if score then
+        key = KEYS[2]
+    else
+        score = redis.call("ZSCORE", KEYS[1], ARGV[1])
+    end
+
+    local weight = tonumber(ARGV[2])
+    if score then
+        -- log(exp(score) + exp(weight)) without overflowing
+        score = tonumber(score)
+        local high = math.max(score, weight)
+        weight = high + math.log(math.exp(score - high) + math.exp(weight - high))
+    end
+    redis.call("ZADD", key, weight, ARGV[1])
+    """,
+)
+
+
+# Gets the 0-based rank the member ARGV[1] of the sorted set KEYS[1] would have with ARGV[2]
+# more votes, false if it's a member of KEYS[2]. A member of neither is ranked as a new track.
+# The score is restored before the script returns, so no other client sees the change
+_RANK_WITH_VOTES_SCRIPT = redis_client.register_script(
+    """
+    local score = redis.call("ZSCORE", KEYS[1], ARGV[1])
+    if not score and redis.call("ZSCORE", KEYS[2], ARGV[1]) then
+        return false
+    end
+
+    redis.call("ZADD", KEYS[1], (score and tonumber(score) or 0) + tonumber(ARGV[2]), ARGV[1])
+    local rank = redis.call("ZREVRANK", KEYS[1], ARGV[1])
+    if score then
+        redis.call("ZADD", KEYS[1], score, ARGV[1])
+    else
+        redis.call("ZREM", KEYS[1], ARGV[1])
+    end
+    return rank
+    """,
+)
+
+
+def is_enabled() -> bool:
+    """Whether the top is served from the Redis leaderboard."""
+    return settings.leaderboard.backend == "redis"
+
+
+def is_trending_enabled() -> bool:
+    """Whether the trending top is offered and its scores are kept."""
+    return settings.leaderboard.trending
+
+
+def is_maintained() -> bool:
+    """Whether the Redis leaderboard is kept up to date, it is on every backend but the view."""
+    return settings.leaderboard.backend != "view"
+
+
+def add_track(session: AsyncSession, track_id: int) -> None:
+    """Add a new track without votes to the top once the session's transaction commits."""
+    if not is_maintained():
+        return
+
+    async def command(pipeline: Pipeline) -> None:
+        await pipeline.zadd(TOP_KEY, {_member(track_id): 0}, nx=True)
+
+    on_commit(session, redis_client, command)
+
+
+def add_vote(session: AsyncSession, track_id: int) -> None:
+    """Count a vote for the track once the session's transaction commits."""
+    add_votes(session, {track_id: 1})
+
+
+def add_votes(session: AsyncSession, vote_counts: Mapping[int, int]) -> None:
+    """Count new votes of several tracks once the session's transaction commits.
+
+    The votes are weighted as cast now in the trending scores.
+    """
+    weight = _get_weight(time.time())
+
+    async def command(pipeline: Pipeline) -> None:
+        for track_id, vote_count in vote_counts.items():
+            # Only the set the track is a member of is incremented
+            if is_maintained():
+                await pipeline.zadd(TOP_KEY, {_member(track_id): vote_count}, xx=True, incr=True)
+                await pipeline.zadd(USED_KEY, {_member(track_id): vote_count}, xx=True, incr=True)
+
+            if is_trending_enabled():
+                await _ADD_TRENDING_SCRIPT(
+                    keys=[TRENDING_KEY, TRENDING_USED_KEY],
+                    args=[_member(track_id), weight + math.log(vote_count)],
+                    client=pipeline,
+                )
+
+    on_commit(session, redis_client, command)
+
+
+def remove_track(session: AsyncSession, track_id: int) -> None:
+    """Remove a deleted track once the session's transaction commits."""
+
+    async def command(pipeline: Pipeline) -> None:
+        if is_maintained():
+            await pipeline.zrem(TOP_KEY, _member(track_id))
+            await pipeline.zrem(USED_KEY, _member(track_id))
+
+        if is_trending_enabled():
+            await pipeline.zrem(TRENDING_KEY, _member(track_id))
+            await pipeline.zrem(TRENDING_USED_KEY, _member(track_id))
+
+    on_commit(session, redis_client, command)
+
+
+def set_used(session: AsyncSession, track_id: int, *, is_used: bool) -> None:
+    """Move the track out of the top or back into it once the session's transaction commits."""
+    keys = [TOP_KEY, USED_KEY] if is_used else [USED_KEY, TOP_KEY]
+    trending_keys = [TRENDING_KEY, TRENDING_USED_KEY] if is_used else [TRENDING_USED_KEY, TRENDING_KEY]
+
+    async def command(pipeline: Pipeline) -> None:
+        if is_maintained():
+            await _MOVE_SCRIPT(keys=keys, args=[_member(track_id)], client=pipeline)
+
+        if is_trending_enabled():
+            await _MOVE_SCRIPT(keys=trending_keys, args=[_member(track_id)], client=pipeline)
+
+    on_commit(session, redis_client, command)
+
+
+async def get_page(
+    session: AsyncSession,
+    limit: int,
+    offset: int,
+) -> list[tuple[int, int]]:
+    """Get a page of unused track ids with their vote counts, most voted first.
+
+    Ties are ordered by id, newest first, like the top in Postgres.
+    """
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        await pipeline.exists(BUILT_KEY)
+        await pipeline.zrevrange(TOP_KEY, offset, offset + limit - 1, withscores=True)
+        is_built, rows = await pipeline.execute()
+
+    if not is_built:
+        await rebuild(session)
+        rows = await redis_client.zrevrange(TOP_KEY, offset, offset + limit - 1, withscores=True)
+
+    return [(int(member), int(score)) for member, score in rows]
+
+
+async def get_size(session: AsyncSession) -> int:
+    """Get the number of unused tracks."""
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        await pipeline.exists(BUILT_KEY)
+        await pipeline.zcard(TOP_KEY)
+        is_built, size = await pipeline.execute()
+
+    if not is_built:
+        await rebuild(session)
+        size = await redis_client.zcard(TOP_KEY)
+
+    return size
+
+
+async def get_rank(session: AsyncSession, track_id: int, *, pending_votes: int = 0) -> int | None:
+    """Get the 0-based position of the track in the top, None if it's used or doesn't exist.
+
+    Votes for the track not counted yet, like one whose transaction hasn't committed, are
+    counted with pending_votes.
+    """
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        await pipeline.exists(BUILT_KEY)
+        await _get_rank(pipeline, track_id, pending_votes)
+        is_built, rank = await pipeline.execute()
+
+    if not is_built:
+        await rebuild(session)
+        rank = await _get_rank(redis_client, track_id, pending_votes)
+
+    return rank
+
+
+async def _get_rank(client: Redis | Pipeline, track_id: int, pending_votes: int) -> int | None:
+    if not pending_votes:
+        return await client.zrevrank(TOP_KEY, _member(track_id))
+
+    return await _RANK_WITH_VOTES_SCRIPT(
+        keys=[TOP_KEY, USED_KEY],
+        args=[_member(track_id), pending_votes],
+        client=client,
+    )
+
+
+async def rebuild(session: AsyncSession, *, force: bool = False) -> None:
+    """Rebuild the leaderboard from Postgres, unless it was built in the meantime.
+
+    The new sorted sets replace the old ones atomically. A vote committed while the counts
+    are read may be missed, the next rebuild corrects it.
+    """
+    async with redis_client.lock(REBUILD_LOCK_KEY, timeout=REBUILD_LOCK_TIMEOUT):
+        if not force and await redis_client.exists(BUILT_KEY):
+            return
+
+        result = await session.execute(select(TrackModel.id, TrackModel.vote_count, TrackModel.is_used))
+
+        top: dict[str, int] = {}
+        used: dict[str, int] = {}
+        for track_id, vote_count, is_used in result.tuples():
+            (used if is_used else top)[_member(track_id)] = vote_count
+
+        async with redis_client.pipeline(transaction=True) as pipeline:
+            await pipeline.delete(TOP_KEY, USED_KEY)
+            if top:
+                await pipeline.zadd(TOP_KEY, top)
+            if used:
+                await pipeline.zadd(USED_KEY, used)
+            await pipeline.set(BUILT_KEY, 1)
+            await pipeline.execute()
+
+    logger.info(f"leaderboard rebuilt with {len(top)} unused and {len(used)} used tracks")
+
+
+async def get_trending_page(
+    session: AsyncSession,
+    limit: int,
+    offset: int,
+) -> list[int]:
+    """Get a page of ids of unused tracks with votes, trending first."""
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        await pipeline.exists(TRENDING_BUILT_KEY)
+        await pipeline.zrevrange(TRENDING_KEY, offset, offset + limit - 1)
+        is_built, members = await pipeline.execute()
+
+    if not is_built:
+        await rebuild_trending(session)
+        members = await redis_client.zrevrange(TRENDING_KEY, offset, offset + limit - 1)
+
+    return [int(member) for member in members]
+
+
+async def get_trending_size(session: AsyncSession) -> int:
+    """Get the number of unused tracks with votes."""
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        await pipeline.exists(TRENDING_BUILT_KEY)
+        await pipeline.zcard(TRENDING_KEY)
+        is_built, size = await pipeline.execute()
+
+    if not is_built:
+        await rebuild_trending(session)
+        size = await redis_client.zcard(TRENDING_KEY)
+
+    return size
+
+
+async def rebuild_trending(session: AsyncSession) -> None:
+    """Rebuild the trending scores from the votes in Postgres, unless built in the meantime.
+
+    Unlike the vote counts this reads every vote, so it's only done when the scores are
+    missing. Drift is corrected by reconcile_trending, which only reads recent votes.
+    """
+    async with redis_client.lock(TRENDING_REBUILD_LOCK_KEY, timeout=REBUILD_LOCK_TIMEOUT):
+        if await redis_client.exists(TRENDING_BUILT_KEY):
+            return
+
+        result = await session.execute(_select_trending_scores())
+
+        trending: dict[str, float] = {}
+        used: dict[str, float] = {}
+        watermark = 0.0
+        for track_id, track_score, latest, is_used in result.tuples():
+            (used if is_used else trending)[_member(track_id)] = float(track_score)
+            watermark = max(watermark, float(latest))
+
+        async with redis_client.pipeline(transaction=True) as pipeline:
+            await pipeline.delete(TRENDING_KEY, TRENDING_USED_KEY)
+            if trending:
+                await pipeline.zadd(TRENDING_KEY, trending)
+            if used:
+                await pipeline.zadd(TRENDING_USED_KEY, used)
+            await pipeline.set(TRENDING_WATERMARK_KEY, watermark)
+            await pipeline.set(TRENDING_BUILT_KEY, 1)
+            await pipeline.execute()
+
+    logger.info(f"trending rebuilt with {len(trending)} unused and {len(used)} used tracks")
+
+
+async def reconcile() -> None:
+    """Rebuild the leaderboard from Postgres to correct any drift."""
+    async with sessionmaker() as session:
+        await rebuild(session, force=True)
+
+
+async def reconcile_trending() -> None:
+    """Recompute the trending scores of the tracks voted for since the last reconcile.
+
+    Only the votes of those tracks are read, found by the watermark of the latest vote read
+    before, so a vote whose score update was lost is corrected. Scores that were never built
+    are left to be built when first read.
+    """
+    async with redis_client.lock(TRENDING_REBUILD_LOCK_KEY, timeout=REBUILD_LOCK_TIMEOUT):
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            await pipeline.exists(TRENDING_BUILT_KEY)
+            await pipeline.get(TRENDING_WATERMARK_KEY)
+            is_built, watermark = await pipeline.execute()
+
+        if not is_built:
+            return
+
+        # Scores built before watermarks were kept are reconciled from now on
+        if watermark is None:
+            await redis_client.set(TRENDING_WATERMARK_KEY, time.time())
+            return
+
+        since = float(watermark) - TRENDING_RECONCILE_OVERLAP
+        recent = (
+            select(VoteModel.track_id)
+            .where(VoteModel.created_at > func.to_timestamp(since))
+            .distinct()
+            .scalar_subquery()
+        )
+
+        async with sessionmaker() as session:
+            result = await session.execute(_select_trending_scores(recent))
+            rows = result.tuples().all()
+
+        if not rows:
+            return
+
+        async with redis_client.pipeline(transaction=True) as pipeline:
+            for track_id, track_score, _, is_used in rows:
+                key, other_key = (TRENDING_USED_KEY, TRENDING_KEY) if is_used else (TRENDING_KEY, TRENDING_USED_KEY)
+                await pipeline.zrem(other_key, _member(track_id))
+                await pipeline.zadd(key, {_member(track_id): float(track_score)})
+            await pipeline.set(TRENDING_WATERMARK_KEY, max(float(watermark), *(float(row[2]) for row in rows)))
+            await pipeline.execute()
+
+    logger.info(f"trending reconciled for {len(rows)} tracks")
+
+
+def _select_trending_scores(track_ids: ColumnElement[int] | None = None) -> Select[tuple[int, float, float, bool]]:
+    """Select (track_id, score, epoch of the latest vote, is_used) of tracks with votes."""
+    # Summed relative to the latest vote of each track, so exp doesn't overflow, and
+    # clamped, since Postgres raises on underflow instead of returning 0
+    decay = _get_decay()
+    timestamp = func.extract("epoch", VoteModel.created_at)
+    latest = func.max(timestamp).over(partition_by=VoteModel.track_id)
+    votes = select(VoteModel.track_id, timestamp.label("timestamp"), latest.label("latest"))
+    if track_ids is not None:
+        votes = votes.where(VoteModel.track_id.in_(track_ids))
+    votes = votes.subquery()
+    relative_weight = func.greatest(decay * (votes.c.timestamp - votes.c.latest), literal_column("-700"))
+    score = decay * votes.c.latest + func.ln(func.sum(func.exp(relative_weight)))
+
+    return (
+        select(votes.c.track_id, score, votes.c.latest, TrackModel.is_used)
+        .join(TrackModel, TrackModel.id == votes.c.track_id)
+        .group_by(votes.c.track_id, votes.c.latest, TrackModel.id)
+    )
+
+
+def _get_decay() -> float:
+    return math.log(2) / settings.leaderboard.trending_half_life
+
+
+def _get_weight(timestamp: float) -> float:
+    return _get_decay() * timestamp
+
+
+def _member(track_id: int) -> str:
+    # Zero padding makes members of equal score sort by id, as ties do in Postgres
+    return f"{track_id:010d}"
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+# Cyrillic is written in Latin, so a track typed in either alphabet gets the same key
+_TRANSLITERATION = str.maketrans(
+    {
+        "а": "a",
+        "б": "b",
+        "в": "v",
+        "г": "g",
+        "д": "d",
+        "е": "e",
+        "ё": "e",
+        "ж": "zh",
+        "з": "z",
+        "и": "i",
+        "й": "y",
+        "к": "k",
+        "л": "l",
+        "м": "m",
+        "н": "n",
+        "о": "o",
+        "п": "p",
+        "р": "r",
+        "с": "s",
+        "т": "t",
+        "у": "u",
+        "ф": "f",
+        "х": "h",
+        "ц": "ts",
+        "ч": "ch",
+        "ш": "sh",
+        "щ": "sch",
+        "ъ": "",
+        "ы": "y",
+        "ь": "",
+        "э": "e",
+        "ю": "yu",
+        "я": "ya",
+        "і": "i",
+        "ї": "yi",
+        "є": "ye",
+        "ґ": "g",
+    }
+)
+# Apostrophes are dropped inside words, "don't" and "dont" are the same word
+_APOSTROPHES = re.compile(r"['’`ʼ]")
+_PUNCTUATION = re.compile(r"[\W_]+")
+# Tokens that mark featured artists or producers rather than name anything
+STOP_TOKENS = frozenset({"feat", "ft", "featuring", "prod"})
+
+
+def normalize(value: str) -> str:
+    """Get the search key of an artist, a title or a part of a search query.
+
+    The value is NFKC-normalized and casefolded, Cyrillic is transliterated to Latin,
+    punctuation becomes spaces and stop tokens like "feat" are dropped.
+
+    Keys are stored on tracks, so a change here needs a migration recomputing them.
+    """
+    value = unicodedata.normalize("NFKC", value).casefold()
+    value = value.translate(_TRANSLITERATION)
+    value = _APOSTROPHES.sub("", value)
+    words = _PUNCTUATION.sub(" ", value).split()
+    return " ".join(word for word in words if word not in STOP_TOKENS)
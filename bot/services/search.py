@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from sqlalchemy import select
+
+from bot.core.loader import sessionmaker, settings
+from bot.database.models import TrackModel
+from bot.services.normalization import normalize
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Words trigrams are extracted from, pg_trgm only keeps alphanumeric characters
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+# A substring match of a query part shares a trigram with the field only if a word has this many characters
+_TRIGRAM_LENGTH = 3
+
+
+def normalize_query(track_query: str) -> str:
+    """Normalize a track query like the search keys of tracks, keeping the dash of "Artist - Title".
+
+    Queries searched the same way get the same normalized query, which is normalized already.
+    """
+    if "-" in track_query:
+        artist, title = (normalize(part) for part in track_query.split("-", 1))
+        if artist and title:
+            return f"{artist} - {title}"
+
+    return normalize(track_query)
+
+
+def get_search_strategies(track_query: str) -> list[tuple[str | None, str]]:
+    """Get the ways to read a track query, tried in order until one finds tracks.
+
+    "Artist - Title" is read as written and swapped. Otherwise the whole query is matched
+    against the artist or the title, then the first word and the first two words are read
+    as the artist. The query is normalized first, a query of stop tokens only has no way.
+
+    Returns:
+        List of tuples containing (artist or None, title).
+
+    """
+    track_query = normalize_query(track_query)
+    if not track_query:
+        return []
+
+    if " - " in track_query:
+        artist, title = track_query.split(" - ", 1)
+        return [(artist, title), (title, artist)]
+
+    strategies: list[tuple[str | None, str]] = [(None, track_query)]
+
+    words = track_query.split()
+    if len(words) >= 2:  # noqa: PLR2004
+        strategies.append((words[0], " ".join(words[1:])))
+    if len(words) >= 3:  # noqa: PLR2004
+        strategies.append((" ".join(words[:2]), " ".join(words[2:])))
+
+    return strategies
+
+
+def get_trigrams(value: str) -> frozenset[str]:
+    """Get the trigrams of the string the way pg_trgm extracts them.
+
+    Each lowercased word is padded with two spaces in front and one behind.
+    """
+    trigrams: set[str] = set()
+    for word in _WORD_PATTERN.findall(value.lower()):
+        padded = f"  {word} "
+        trigrams.update(padded[index : index + 3] for index in range(len(padded) - 2))
+    return frozenset(trigrams)
+
+
+def get_similarity(trigrams: frozenset[str], other_trigrams: frozenset[str]) -> float:
+    """Get the share of common trigrams, like pg_trgm's similarity()."""
+    if not trigrams or not other_trigrams:
+        return 0.0
+
+    shared = len(trigrams & other_trigrams)
+    return shared / (len(trigrams) + len(other_trigrams) - shared)
+
+
+@dataclass(frozen=True, slots=True)
+class _Field:
+    value: str
+    trigrams: frozenset[str]
+
+    @classmethod
+    def from_value(cls, value: str) -> _Field:
+        """Get the field of a value normalized already."""
+        return cls(value, get_trigrams(value))
+
+    def match(self, query: _Field, similarity_threshold: float) -> tuple[float, bool]:
+        """Get the similarity to the query and whether it's above the threshold or the query is a substring."""
+        similarity = get_similarity(self.trigrams, query.trigrams)
+        return similarity, similarity > similarity_threshold or query.value in self.value
+
+
+@dataclass(frozen=True, slots=True)
+class _Document:
+    artist: _Field
+    title: _Field
+
+
+class TrackSearchIndex:
+    """In-process trigram index of the normalized artists and titles of all tracks.
+
+    Matches tracks like search_tracks does in Postgres, and answers every strategy of
+    get_search_strategies in one pass over the tracks sharing a trigram with the query.
+    """
+
+    def __init__(self) -> None:
+        self.__documents: dict[int, _Document] = {}
+        self.__postings: defaultdict[str, set[int]] = defaultdict(set)
+        self.is_loaded = False
+
+    def __len__(self) -> int:
+        return len(self.__documents)
+
+    async def load(self, session: AsyncSession) -> None:
+        """Replace the index with all tracks in the database."""
+        result = await session.execute(select(TrackModel.id, TrackModel.artist, TrackModel.title))
+
+        self.__documents.clear()
+        self.__postings.clear()
+        for track_id, artist, title in result.tuples():
+            self.add(track_id, artist, title)
+
+        self.is_loaded = True
+
+    def add(self, track_id: int, artist: str, title: str) -> None:
+        """Add a track, replacing it if it's indexed already."""
+        self.remove(track_id)
+
+        document = _Document(_Field.from_value(normalize(artist)), _Field.from_value(normalize(title)))
+        self.__documents[track_id] = document
+        for trigram in document.artist.trigrams | document.title.trigrams:
+            self.__postings[trigram].add(track_id)
+
+    def remove(self, track_id: int) -> None:
+        document = self.__documents.pop(track_id, None)
+        if document is None:
+            return
+
+        for trigram in document.artist.trigrams | document.title.trigrams:
+            postings = self.__postings[trigram]
+            postings.discard(track_id)
+            if not postings:
+                del self.__postings[trigram]
+
+    def search(
+        self,
+        track_query: str,
+        limit: int = 3,
+        similarity_threshold: float = 0.3,
+    ) -> list[int]:
+        """Search tracks with the first strategy of get_search_strategies that finds any.
+
+        Returns:
+            Ids of the matching tracks, best match first.
+
+        """
+        strategies = [
+            (None if artist is None else _Field.from_value(artist), _Field.from_value(title))
+            for artist, title in get_search_strategies(track_query)
+        ]
+        if not strategies:
+            return []
+
+        results: list[list[tuple[float, int]]] = [[] for _ in strategies]
+
+        for track_id in self.__get_candidates(normalize(track_query)):
+            document = self.__documents[track_id]
+            for strategy, (artist, title) in enumerate(strategies):
+                score = self.__score(document, artist, title, similarity_threshold)
+                if score is not None:
+                    results[strategy].append((score, track_id))
+
+        for matches in results:
+            if matches:
+                matches.sort(reverse=True)
+                return [track_id for _, track_id in matches[:limit]]
+
+        return []
+
+    def __get_candidates(self, normalized_query: str) -> set[int] | dict[int, _Document]:
+        # Every strategy is made of the query's words, so a match shares a trigram with it,
+        # unless it's only a substring match of words too short to contain a whole trigram
+        if not any(len(word) >= _TRIGRAM_LENGTH for word in _WORD_PATTERN.findall(normalized_query)):
+            return self.__documents
+
+        candidates: set[int] = set()
+        for trigram in get_trigrams(normalized_query):
+            candidates.update(self.__postings.get(trigram, ()))
+        return candidates
+
+    @staticmethod
+    def __score(
+        document: _Document,
+        artist: _Field | None,
+        title: _Field,
+        similarity_threshold: float,
+    ) -> float | None:
+        title_similarity, is_title_match = document.title.match(title, similarity_threshold)
+
+        if artist is None:
+            # The whole query may as well be the artist
+            artist_similarity, is_artist_match = document.artist.match(title, similarity_threshold)
+            if not is_title_match and not is_artist_match:
+                return None
+            return max(title_similarity, artist_similarity)
+
+        artist_similarity, is_artist_match = document.artist.match(artist, similarity_threshold)
+        if not is_title_match or not is_artist_match:
+            return None
+        return (artist_similarity + title_similarity) / 2
+
+
+search_index = TrackSearchIndex()
+
+
+def is_enabled() -> bool:
+    """Whether tracks are searched in the in-process index rather than in Postgres."""
+    return settings.search.engine == "memory" and search_index.is_loaded
+
+
+async def load_search_index() -> None:
+    """Load all tracks into the in-process index, dropping any drift from other instances."""
+    if settings.search.engine != "memory":
+        return
+
+    async with sessionmaker() as session:
+        await search_index.load(session)
+
+    logger.info(f"search index loaded with {len(search_index)} tracks")
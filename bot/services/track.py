@@ -1,21 +1,62 @@
 from __future__ import annotations
 
+from functools import partial
 from typing import TYPE_CHECKING
 
+from loguru import logger
 from psycopg.errors import UniqueViolation
-from sqlalchemy import desc, exists, func, select, update
+from sqlalchemy import (
+    Float,
+    Integer,
+    and_,
+    any_,
+    bindparam,
+    delete,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import text
 
-from bot.cache.redis import DAY, build_key, build_key_with_defaults, cached, clear_cache
-from bot.database.models import TrackModel, VoteModel
-from bot.services import errors
+from bot.cache.invalidation import after_commit, apply_invalidations, invalidate, on_commit
+from bot.cache.redis import (
+    DAY,
+    DEFAULT_TTL,
+    HOUR,
+    MINUTE,
+    build_key,
+    build_key_with_defaults,
+    cached,
+    cached_many,
+    clear_cache,
+)
+from bot.cache.serialization import ModelSerializer
+from bot.core.loader import redis_client, sessionmaker, settings
+from bot.database.models import TopTrackModel, TrackModel, VoteModel
+from bot.services import errors, leaderboard, search, voters
+from bot.services.normalization import normalize
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from redis.asyncio.client import Pipeline
+    from sqlalchemy import ColumnElement, Select
     from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import InstrumentedAttribute
+
+# Set when the top changed since the top_tracks view was last refreshed
+TOP_VIEW_DIRTY_KEY = "top_tracks:dirty"
 
 
-@cached(ttl=DAY, key_builder=lambda session, track_id: build_key(track_id))
+@cached(ttl=DAY, key_builder=lambda session, track_id: build_key(track_id), versioned=True, local_ttl=HOUR)
 async def track_exists(
     session: AsyncSession,
     track_id: int,
@@ -25,86 +66,222 @@ async def track_exists(
     return bool(result)
 
 
-@cached(key_builder=build_key_with_defaults("limit", "offset", "ignore_used"))
-async def get_tracks_by_votes(
+# Same predicate as the partial index on (vote_count DESC, id DESC), so the top is read from it
+IS_UNUSED = and_(TrackModel.tiktok_url.is_(None), TrackModel.youtube_url.is_(None))
+
+
+@cached(
+    ttl=DAY,
+    key_builder=build_key_with_defaults("limit", "offset", "vote_count", "track_id"),
+    serializer=ModelSerializer(TrackModel),
+    versioned=True,
+    local_ttl=MINUTE,
+    lock_timeout=10,
+    soft_ttl=DEFAULT_TTL,
+    early_refresh=1.0,
+)
+async def get_tracks_page_by_votes(
     session: AsyncSession,
     limit: int = 10,
     offset: int = 0,
-    *,
-    ignore_used: bool = True,
-) -> list[tuple[TrackModel, int]]:
-    """Get top n tracks by votes.
+    vote_count: int | None = None,
+    track_id: int | None = None,
+) -> tuple[list[tuple[TrackModel, int]], int]:
+    """Get a page of unused tracks by votes together with the number of unused tracks.
+
+    The page is skipped to by offset, or found by seeking the top index to the (vote_count,
+    track_id) cursor, the last row of the previous page, so it costs the same however deep it
+    is. The total is a scalar subquery of the same statement, so a page costs one query and
+    one cache entry.
 
     Returns:
-        List of tuples containing (TrackModel, vote_count).
-        Vote count is 0 for tracks with no votes.
+        Tuple of the page, a list of (TrackModel, vote_count), and the number of unused tracks.
 
     """
-    vote_counts = (
-        select(
-            VoteModel.track_id,
-            func.count(VoteModel.id).label("vote_count"),
-        )
-        .group_by(VoteModel.track_id)
-        .subquery()
-    )
-
+    total = select(func.count()).select_from(TrackModel).where(IS_UNUSED).scalar_subquery()
     query = (
-        select(TrackModel, vote_counts.c.vote_count)
-        .outerjoin(vote_counts, TrackModel.id == vote_counts.c.track_id)
-        .order_by(
-            vote_counts.c.vote_count.desc().nulls_last(),
-            TrackModel.id.desc(),
-        )
+        select(TrackModel, TrackModel.vote_count, total)
+        .where(IS_UNUSED)
+        .order_by(TrackModel.vote_count.desc(), TrackModel.id.desc())
+        .limit(limit)
     )
 
-    if ignore_used:
-        query = query.where(TrackModel.is_used == False)  # noqa: E712
-
-    query = query.limit(limit).offset(offset)
+    if vote_count is not None and track_id is not None:
+        query = query.where(tuple_(TrackModel.vote_count, TrackModel.id) < tuple_(vote_count, track_id))
+    else:
+        query = query.offset(offset)
 
     result = await session.execute(query)
-    rows = result.all()
+    rows = result.tuples().all()
+
+    # A page past the end has no rows to carry the total
+    if not rows:
+        return [], await session.scalar(select(total))
+
+    return [(track, track_vote_count) for track, track_vote_count, _ in rows], rows[0][2]
+
+
+def invalidate_top(session: AsyncSession) -> None:
+    """Invalidate all cached pages of the top once the session's transaction commits.
+
+    Pages and ranks read from the top_tracks view stay cached until the view is refreshed,
+    the view is only marked as dirty.
+    """
+    invalidate(session, get_tracks_page_by_votes)
 
-    return [(row[0], row[1] or 0) for row in rows]
+    if settings.leaderboard.backend != "view":
+        invalidate(session, get_track_rank)
+        return
 
+    async def command(pipeline: Pipeline) -> None:
+        await pipeline.set(TOP_VIEW_DIRTY_KEY, 1)
 
-@cached(key_builder=build_key_with_defaults("ignore_used"))
-async def get_tracks_count(
+    on_commit(session, redis_client, command)
+
+
+@cached(
+    ttl=DAY,
+    key_builder=build_key_with_defaults("limit", "offset"),
+    serializer=ModelSerializer(TrackModel),
+    versioned=True,
+    local_ttl=MINUTE,
+    lock_timeout=10,
+    soft_ttl=DEFAULT_TTL,
+    early_refresh=1.0,
+)
+async def get_tracks_by_rank(
     session: AsyncSession,
-    *,
-    ignore_used: bool = True,
-) -> int:
-    """Get the number of tracks.
+    limit: int = 10,
+    offset: int = 0,
+) -> list[tuple[TrackModel, int]]:
+    """Get top n unused tracks by votes from the top_tracks view.
+
+    Ranks are consecutive, so the page is a range of the rank index however deep it is. The
+    view is refreshed periodically, until then votes are not reflected.
 
     Returns:
-        The number of tracks.
+        List of tuples containing (TrackModel, vote_count), like get_tracks_page_by_votes.
 
     """
-    query = select(func.count(TrackModel.id))
-    if ignore_used:
-        query = query.where(TrackModel.is_used == False)  # noqa: E712
+    query = (
+        select(TrackModel, TopTrackModel.vote_count)
+        .join(TopTrackModel, TopTrackModel.track_id == TrackModel.id)
+        .where(
+            ~TopTrackModel.is_used,
+            TopTrackModel.rank > offset,
+            TopTrackModel.rank <= offset + limit,
+        )
+        .order_by(TopTrackModel.rank)
+    )
 
+    result = await session.execute(query)
+    return [(track, vote_count) for track, vote_count in result.tuples()]
+
+
+@cached(
+    ttl=DAY,
+    key_builder=build_key_with_defaults(),
+    versioned=True,
+    local_ttl=MINUTE,
+    lock_timeout=10,
+    soft_ttl=DEFAULT_TTL,
+    early_refresh=1.0,
+)
+async def get_ranked_tracks_count(session: AsyncSession) -> int:
+    """Get the number of unused tracks in the top_tracks view."""
+    query = select(func.count()).select_from(TopTrackModel).where(~TopTrackModel.is_used)
     result = await session.execute(query)
     return result.scalar_one()
 
 
+async def refresh_top_tracks_view(*, force: bool = False) -> None:
+    """Refresh the top_tracks view if the top changed since the last refresh.
+
+    The view is refreshed concurrently, so the top stays readable meanwhile. A change
+    committed during the refresh marks the view dirty again and is picked up next time.
+    """
+    if not await redis_client.getdel(TOP_VIEW_DIRTY_KEY) and not force:
+        return
+
+    async with sessionmaker() as session:
+        await session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY top_tracks"))
+        await session.commit()
+
+    await clear_cache(get_tracks_by_rank)
+    await clear_cache(get_ranked_tracks_count)
+    await clear_cache(get_track_rank)
+
+
+def _match_trigrams(column: InstrumentedAttribute[str], value: str) -> tuple[ColumnElement[bool], ColumnElement[float]]:
+    """Get whether the search key column is similar to the normalized value or contains it, and their similarity.
+
+    Both conditions can use the trigram index on the column, similarity() can't. Normalized
+    values have no punctuation, so they never contain LIKE wildcards.
+    """
+    condition = or_(column.op("%")(value), column.like(f"%{value}%"))
+    return condition, func.similarity(column, value, type_=Float)
+
+
+def build_search_query(
+    strategies: Sequence[tuple[str | None, str]],
+    limit: int = 3,
+) -> Select[tuple[TrackModel]]:
+    """Build the query of tracks matching the first of the strategies that finds any.
+
+    Every strategy of get_search_strategies is a branch of a union, ranked by its position.
+    The % operator compares to pg_trgm.similarity_threshold, which has to be set before running it.
+    """
+    branches = []
+    for strategy, (artist_name, song_name) in enumerate(strategies):
+        is_title_match, title_similarity = _match_trigrams(TrackModel.title_search_key, song_name)
+        if artist_name is None:
+            # The whole query may as well be the artist
+            is_artist_match, artist_similarity = _match_trigrams(TrackModel.artist_search_key, song_name)
+            condition = or_(is_title_match, is_artist_match)
+            score = func.greatest(title_similarity, artist_similarity)
+        else:
+            is_artist_match, artist_similarity = _match_trigrams(TrackModel.artist_search_key, artist_name)
+            condition = and_(is_title_match, is_artist_match)
+            score = (artist_similarity + title_similarity) / 2
+
+        branches.append(
+            select(
+                literal(strategy).label("strategy"),
+                TrackModel.id.label("track_id"),
+                score.label("score"),
+            ).where(condition)
+        )
+
+    matches = union_all(*branches).cte("matches")
+    return (
+        select(TrackModel)
+        .join(matches, matches.c.track_id == TrackModel.id)
+        .where(matches.c.strategy == select(func.min(matches.c.strategy)).scalar_subquery())
+        .order_by(matches.c.score.desc())
+        .limit(limit)
+    )
+
+
+async def set_similarity_threshold(session: AsyncSession, similarity_threshold: float) -> None:
+    """Set the similarity the % operator compares to until the session's transaction ends."""
+    await session.execute(select(func.set_config("pg_trgm.similarity_threshold", str(similarity_threshold), true())))
+
+
 async def search_tracks(
     session: AsyncSession,
-    query_string: str,
-    artist_name: str | None = None,
+    track_query: str,
     limit: int = 3,
     similarity_threshold: float = 0.3,
 ) -> list[TrackModel]:
-    """Search for tracks in the database by title and optionally artist.
+    """Search for tracks in the database with the first strategy of get_search_strategies that finds any.
 
-    Uses PostgreSQL trigram similarity for fuzzy matching (handles typos).
-    Falls back to ILIKE if no similarity matches found.
+    Uses PostgreSQL trigram similarity for fuzzy matching (handles typos), or a substring
+    match, in a single query served by the trigram indexes on the search keys. The query is
+    normalized like the keys, so spelling variants of a track match as the same one.
 
     Args:
         session: Database session.
-        query_string: Track title to search for.
-        artist_name: Optional artist name to narrow search.
+        track_query: Query in any of the formats of get_search_strategies.
         limit: Maximum number of results to return.
         similarity_threshold: Minimum similarity score (0-1). Lower = more lenient.
 
@@ -112,74 +289,12 @@ async def search_tracks(
         List of matching TrackModel instances, ordered by similarity score.
 
     """
-    if artist_name:
-        # Search by both artist and title with similarity
-        query = (
-            select(TrackModel)
-            .where(
-                text(
-                    """
-                    (similarity(LOWER(artist), LOWER(:artist_name)) > :threshold OR
-                     LOWER(artist) LIKE LOWER(:artist_like)) AND
-                    (similarity(LOWER(title), LOWER(:query_string)) > :threshold OR
-                     LOWER(title) LIKE LOWER(:query_like))
-                    """
-                )
-            )
-            .order_by(
-                desc(
-                    text(
-                        """
-                        (similarity(LOWER(artist), LOWER(:artist_name)) +
-                         similarity(LOWER(title), LOWER(:query_string))) / 2
-                        """
-                    )
-                )
-            )
-            .params(
-                artist_name=artist_name,
-                query_string=query_string,
-                threshold=similarity_threshold,
-                artist_like=f"%{artist_name}%",
-                query_like=f"%{query_string}%",
-            )
-            .limit(limit)
-        )
-    else:
-        # Search by title or artist with similarity
-        query = (
-            select(TrackModel)
-            .where(
-                text(
-                    """
-                    similarity(LOWER(title), LOWER(:query_string)) > :threshold OR
-                    similarity(LOWER(artist), LOWER(:query_string)) > :threshold OR
-                    LOWER(title) LIKE LOWER(:query_like) OR
-                    LOWER(artist) LIKE LOWER(:query_like)
-                    """
-                )
-            )
-            .order_by(
-                desc(
-                    text(
-                        """
-                        GREATEST(
-                            similarity(LOWER(title), LOWER(:query_string)),
-                            similarity(LOWER(artist), LOWER(:query_string))
-                        )
-                        """
-                    )
-                )
-            )
-            .params(
-                query_string=query_string,
-                threshold=similarity_threshold,
-                query_like=f"%{query_string}%",
-            )
-            .limit(limit)
-        )
+    strategies = search.get_search_strategies(track_query)
+    if not strategies:
+        return []
 
-    result = await session.execute(query)
+    await set_similarity_threshold(session, similarity_threshold)
+    result = await session.execute(build_search_query(strategies, limit))
     return list(result.scalars().all())
 
 
@@ -189,64 +304,54 @@ async def search_tracks_by_query(
     limit: int = 3,
     similarity_threshold: float = 0.3,
 ) -> list[TrackModel]:
-    # Parse input - try multiple formats
-    artist_name = None
-    song_name = track_query
-
-    # Try parsing "Artist - Song" format
-    if "-" in track_query:
-        parts = track_query.split("-", 1)  # Split only on first "-"
-        if len(parts) == 2 and parts[0].strip() and parts[1].strip():  # noqa: PLR2004
-            artist_name = parts[0].strip()
-            song_name = parts[1].strip()
-
-    # First, search in database with parsed format
-    db_tracks = await search_tracks(
-        session,
-        query_string=song_name,
-        artist_name=artist_name,
-        limit=limit,
-        similarity_threshold=similarity_threshold,
-    )
+    """Search for tracks by a query in any of the formats of get_search_strategies.
 
-    if not db_tracks and artist_name and song_name:
-        db_tracks = await search_tracks(
-            session,
-            query_string=artist_name,
-            artist_name=song_name,
-            limit=limit,
-            similarity_threshold=similarity_threshold,
-        )
+    Postgres results are cached by the normalized query, so spelling variants of a query share them.
+    The in-process index is searched directly, as its results depend on when this process loaded it.
 
-    # If no artist was specified and no results found, try splitting on common patterns
-    # This handles "Artist Song" format (without "-")
-    if artist_name is None and not db_tracks and " " in track_query:
-        # Try treating first word(s) as artist, rest as song
-        words = track_query.split()
-        if len(words) >= 2:  # noqa: PLR2004
-            # Try first word as artist
-            db_tracks = await search_tracks(
-                session,
-                query_string=" ".join(words[1:]),
-                artist_name=words[0],
-                limit=limit,
-                similarity_threshold=similarity_threshold,
-            )
+    Returns:
+        List of matching tracks, best match first.
+
+    """
+    normalized_query = search.normalize_query(track_query)
+    if search.is_enabled():
+        track_ids = search.search_index.search(normalized_query, limit=limit, similarity_threshold=similarity_threshold)
+    else:
+        track_ids = await search_track_ids(session, normalized_query, limit, similarity_threshold)
+    tracks = await get_tracks_by_ids(session, track_ids)
+    # A track deleted after the results were cached is skipped
+    return [track for track_id in track_ids if (track := tracks[track_id]) is not None]
+
+
+@cached(
+    ttl=HOUR,
+    key_builder=build_key_with_defaults("normalized_query", "limit", "similarity_threshold"),
+    versioned=True,
+    local_ttl=MINUTE,
+)
+async def search_track_ids(
+    session: AsyncSession,
+    normalized_query: str,
+    limit: int = 3,
+    similarity_threshold: float = 0.3,
+) -> list[int]:
+    """Search Postgres for tracks by a query normalized with normalize_query.
 
-            # If still no results, try first two words as artist (for multi-word artists)
-            if not db_tracks and len(words) >= 3:  # noqa: PLR2004
-                db_tracks = await search_tracks(
-                    session,
-                    query_string=" ".join(words[2:]),
-                    artist_name=" ".join(words[:2]),
-                    limit=limit,
-                    similarity_threshold=similarity_threshold,
-                )
+    The whole cache is invalidated by any change to the artists or titles of tracks.
 
-    return db_tracks
+    Returns:
+        Ids of the matching tracks, best match first.
+
+    """
+    tracks = await search_tracks(session, normalized_query, limit=limit, similarity_threshold=similarity_threshold)
+    return [track.id for track in tracks]
 
 
-@cached(key_builder=lambda session, track_id: build_key(track_id))
+@cached(
+    key_builder=lambda session, track_id: build_key(track_id),
+    serializer=ModelSerializer(TrackModel),
+    versioned=True,
+)
 async def get_track_by_id(
     session: AsyncSession,
     track_id: int,
@@ -254,7 +359,122 @@ async def get_track_by_id(
     return await session.get(TrackModel, track_id)
 
 
-@cached(key_builder=lambda session, title, artist: build_key(title, artist))
+@cached_many(get_track_by_id)
+async def get_tracks_by_ids(
+    session: AsyncSession,
+    track_ids: Sequence[int],
+) -> dict[int, TrackModel | None]:
+    """Get tracks by their ids.
+
+    Returns:
+        Mapping of every requested id to its track, None for ids that don't exist.
+
+    """
+    query = select(TrackModel).where(TrackModel.id == any_(bindparam("track_ids", list(track_ids), ARRAY(Integer))))
+    result = await session.execute(query)
+    return {track.id: track for track in result.scalars()}
+
+
+async def get_top_tracks(
+    session: AsyncSession,
+    limit: int = 10,
+    offset: int = 0,
+) -> list[tuple[TrackModel, int]]:
+    """Get a page of unused tracks by votes from the Redis leaderboard or the top_tracks view.
+
+    Both seek by offset without skipping rows, Postgres pages are read by get_tracks_page_by_votes.
+
+    Returns:
+        List of tuples containing (TrackModel, vote_count), like get_tracks_page_by_votes.
+
+    """
+    if settings.leaderboard.backend == "view":
+        return await get_tracks_by_rank(session, limit=limit, offset=offset)
+
+    page = await leaderboard.get_page(session, limit=limit, offset=offset)
+    tracks = await get_tracks_by_ids(session, [track_id for track_id, _ in page])
+
+    # A track deleted after the page was read is skipped
+    return [(track, vote_count) for track_id, vote_count in page if (track := tracks[track_id]) is not None]
+
+
+async def get_top_tracks_count(session: AsyncSession) -> int:
+    """Get the number of unused tracks from the Redis leaderboard or the top_tracks view."""
+    if settings.leaderboard.backend == "view":
+        return await get_ranked_tracks_count(session)
+
+    return await leaderboard.get_size(session)
+
+
+async def get_top_page(
+    session: AsyncSession,
+    limit: int = 10,
+    offset: int = 0,
+    after: Sequence[int] | None = None,
+) -> tuple[list[tuple[TrackModel, int]], int]:
+    """Get a page of unused tracks by votes and their number from the configured leaderboard backend.
+
+    In Postgres both are read with a single cached query, the other backends combine
+    get_top_tracks and get_top_tracks_count and ignore the cursor.
+
+    Returns:
+        Tuple of the page, like get_top_tracks, and the number of unused tracks.
+
+    """
+    if settings.leaderboard.backend == "postgres":
+        if after is not None:
+            vote_count, track_id = after
+            return await get_tracks_page_by_votes(session, limit=limit, vote_count=vote_count, track_id=track_id)
+
+        return await get_tracks_page_by_votes(session, limit=limit, offset=offset)
+
+    tracks = await get_top_tracks(session, limit=limit, offset=offset)
+    return tracks, await get_top_tracks_count(session)
+
+
+@cached(ttl=DAY, key_builder=lambda session, track_id: build_key(track_id), versioned=True)
+async def get_track_rank(session: AsyncSession, track_id: int) -> int | None:
+    """Get the 1-based position of the track in the top from the configured leaderboard backend.
+
+    The top_tracks view stores the rank, the other backends answer with ZREVRANK on the
+    Redis leaderboard. Ranks are cached until the top changes. A vote only moves the rank once
+    its transaction commits, use get_track_rank_after_vote for a track just voted for.
+
+    Returns:
+        The rank, or None if the track is used or doesn't exist.
+
+    """
+    if settings.leaderboard.backend == "view":
+        query = select(TopTrackModel.rank).where(TopTrackModel.track_id == track_id, ~TopTrackModel.is_used)
+        return await session.scalar(query)
+
+    rank = await leaderboard.get_rank(session, track_id)
+    return None if rank is None else rank + 1
+
+
+async def get_track_rank_after_vote(session: AsyncSession, track_id: int) -> int | None:
+    """Get the rank of the track counting a vote the session just made for it.
+
+    The vote is added to the score of the track in the Redis leaderboard, so the rank is right
+    before the transaction commits and before a buffered vote is written. The view only
+    counts it once refreshed.
+
+    Returns:
+        The rank, or None if the track is used or doesn't exist.
+
+    """
+    if settings.leaderboard.backend == "view":
+        return await get_track_rank(session, track_id)
+
+    rank = await leaderboard.get_rank(session, track_id, pending_votes=1)
+    return None if rank is None else rank + 1
+
+
+@cached(
+    key_builder=lambda session, title, artist: build_key(title, artist),
+    serializer=ModelSerializer(TrackModel),
+    versioned=True,
+)
 async def get_track_by_title_and_artist(
     session: AsyncSession,
     title: str,
@@ -275,36 +495,43 @@ async def create_track(
 ) -> TrackModel:
     """Create a new track.
 
+    The insert skips an existing track instead of failing, so the transaction stays usable.
+
     Raises:
         TrackAlreadyExistsError: If track already exists.
-        TrackServiceError: If track creation fails.
 
     """
-    new_track = TrackModel(
-        title=title,
-        artist=artist,
+    query = (
+        insert(TrackModel)
+        .values(
+            title=title,
+            artist=artist,
+            title_search_key=normalize(title),
+            artist_search_key=normalize(artist),
+        )
+        .on_conflict_do_nothing(index_elements=[TrackModel.artist, TrackModel.title])
+        .returning(TrackModel)
     )
+    new_track = await session.scalar(query)
 
-    session.add(new_track)
+    if new_track is None:
+        msg = f"track already exists for artist {artist} and title {title}"
+        raise errors.TrackAlreadyExistsError(msg)
 
-    try:
-        await session.flush()
-    except IntegrityError as e:
-        await session.rollback()
+    invalidate_new_track(session, new_track)
 
-        if isinstance(e.orig, UniqueViolation):  # pyright: ignore[reportAttributeAccessIssue]
-            msg = f"track already exists for artist {artist} and title {title}"
-            raise errors.TrackAlreadyExistsError(msg) from e
+    return new_track
 
-        raise errors.TrackServiceError(str(e)) from e
 
-    await clear_cache(track_exists, new_track.id)
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_tracks_count)
-    await clear_cache(get_track_by_id, new_track.id)
-    await clear_cache(get_track_by_title_and_artist, title, artist)
-
-    return new_track
+def invalidate_new_track(session: AsyncSession, new_track: TrackModel) -> None:
+    """Invalidate the caches a new track changes once the session's transaction commits."""
+    invalidate(session, track_exists, new_track.id)
+    invalidate_top(session)
+    invalidate(session, get_track_by_id, new_track.id)
+    invalidate(session, get_track_by_title_and_artist, new_track.title, new_track.artist)
+    leaderboard.add_track(session, new_track.id)
+    invalidate(session, search_track_ids)
+    after_commit(session, partial(search.search_index.add, new_track.id, new_track.artist, new_track.title))
 
 
 async def update_track_title(
@@ -329,7 +556,13 @@ async def update_track_title(
     old_title = track.title
 
     try:
-        await session.execute(update(TrackModel).where(TrackModel.id == track_id).values(title=title))
+        # Scoped to a savepoint, so a conflict doesn't abort the rest of the transaction
+        async with session.begin_nested():
+            await session.execute(
+                update(TrackModel)
+                .where(TrackModel.id == track_id)
+                .values(title=title, title_search_key=normalize(title))
+            )
     except IntegrityError as e:
         if isinstance(e.orig, UniqueViolation):  # pyright: ignore[reportAttributeAccessIssue]
             msg = f"track already exists for artist {track.artist} and title {title}"
@@ -337,10 +570,12 @@ async def update_track_title(
 
         raise errors.TrackServiceError(str(e)) from e
 
-    await clear_cache(get_track_by_id, track_id)
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_track_by_title_and_artist, old_title, track.artist)
-    await clear_cache(get_track_by_title_and_artist, title, track.artist)
+    invalidate(session, get_track_by_id, track_id)
+    invalidate_top(session)
+    invalidate(session, get_track_by_title_and_artist, old_title, track.artist)
+    invalidate(session, get_track_by_title_and_artist, title, track.artist)
+    invalidate(session, search_track_ids)
+    after_commit(session, partial(search.search_index.add, track_id, track.artist, title))
 
 
 async def update_track_artist(
@@ -365,7 +600,13 @@ async def update_track_artist(
     old_artist = track.artist
 
     try:
-        await session.execute(update(TrackModel).where(TrackModel.id == track_id).values(artist=artist))
+        # Scoped to a savepoint, so a conflict doesn't abort the rest of the transaction
+        async with session.begin_nested():
+            await session.execute(
+                update(TrackModel)
+                .where(TrackModel.id == track_id)
+                .values(artist=artist, artist_search_key=normalize(artist))
+            )
     except IntegrityError as e:
         if isinstance(e.orig, UniqueViolation):  # pyright: ignore[reportAttributeAccessIssue]
             msg = f"track already exists for artist {artist} and title {track.title}"
@@ -373,10 +614,12 @@ async def update_track_artist(
 
         raise errors.TrackServiceError(str(e)) from e
 
-    await clear_cache(get_track_by_id, track_id)
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_track_by_title_and_artist, track.title, old_artist)
-    await clear_cache(get_track_by_title_and_artist, track.title, artist)
+    invalidate(session, get_track_by_id, track_id)
+    invalidate_top(session)
+    invalidate(session, get_track_by_title_and_artist, track.title, old_artist)
+    invalidate(session, get_track_by_title_and_artist, track.title, artist)
+    invalidate(session, search_track_ids)
+    after_commit(session, partial(search.search_index.add, track_id, artist, track.title))
 
 
 async def update_track_tiktok_url(
@@ -398,10 +641,13 @@ async def update_track_tiktok_url(
 
     await session.execute(update(TrackModel).where(TrackModel.id == track_id).values(tiktok_url=tiktok_url))
 
-    await clear_cache(get_track_by_id, track_id)
-    await clear_cache(get_track_by_title_and_artist, track.title, track.artist)
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_tracks_count)
+    is_used = tiktok_url is not None or track.youtube_url is not None
+    if is_used != track.is_used:
+        leaderboard.set_used(session, track_id, is_used=is_used)
+
+    invalidate(session, get_track_by_id, track_id)
+    invalidate(session, get_track_by_title_and_artist, track.title, track.artist)
+    invalidate_top(session)
 
 
 async def update_track_youtube_url(
@@ -424,10 +670,13 @@ async def update_track_youtube_url(
 
     await session.execute(update(TrackModel).where(TrackModel.id == track_id).values(youtube_url=youtube_url))
 
-    await clear_cache(get_track_by_id, track_id)
-    await clear_cache(get_track_by_title_and_artist, track.title, track.artist)
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_tracks_count)
+    is_used = youtube_url is not None or track.tiktok_url is not None
+    if is_used != track.is_used:
+        leaderboard.set_used(session, track_id, is_used=is_used)
+
+    invalidate(session, get_track_by_id, track_id)
+    invalidate(session, get_track_by_title_and_artist, track.title, track.artist)
+    invalidate_top(session)
 
 
 async def delete_track(
@@ -447,13 +696,66 @@ async def delete_track(
         msg = f"Track with id {track_id} not found"
         raise errors.TrackNotFoundError(msg)
 
-    await session.delete(track)
+    # The track may be a cached snapshot rather than an instance bound to the session
+    await session.execute(delete(TrackModel).where(TrackModel.id == track_id))
 
     from bot.services.vote import get_votes_count_by_track
 
-    await clear_cache(track_exists, track_id)
-    await clear_cache(get_track_by_id, track_id)
-    await clear_cache(get_track_by_title_and_artist, track.title, track.artist)
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_tracks_count)
-    await clear_cache(get_votes_count_by_track, track_id)
+    invalidate(session, track_exists, track_id)
+    invalidate(session, get_track_by_id, track_id)
+    invalidate(session, get_track_by_title_and_artist, track.title, track.artist)
+    invalidate_top(session)
+    invalidate(session, get_votes_count_by_track, track_id)
+    leaderboard.remove_track(session, track_id)
+    voters.remove_track(session, track_id)
+    invalidate(session, search_track_ids)
+    after_commit(session, partial(search.search_index.remove, track_id))
+
+
+async def check_vote_counts(
+    session: AsyncSession,
+    *,
+    repair: bool = False,
+) -> dict[int, tuple[int, int]]:
+    """Compare the vote_count of every track with its votes, optionally fixing mismatches.
+
+    Returns:
+        Mapping of ids of tracks whose vote_count is wrong to their (stored, counted) votes.
+
+    """
+    vote_counts = (
+        select(VoteModel.track_id, func.count(VoteModel.id).label("vote_count")).group_by(VoteModel.track_id).subquery()
+    )
+    counted = func.coalesce(vote_counts.c.vote_count, 0)
+
+    query = (
+        select(TrackModel.id, TrackModel.vote_count, counted)
+        .outerjoin(vote_counts, TrackModel.id == vote_counts.c.track_id)
+        .where(TrackModel.vote_count != counted)
+    )
+    result = await session.execute(query)
+    mismatches = {track_id: (stored, actual) for track_id, stored, actual in result.tuples()}
+
+    if repair and mismatches:
+        # Counted again while updating, so votes committed since the check are included
+        actual_count = select(func.count(VoteModel.id)).where(VoteModel.track_id == TrackModel.id).scalar_subquery()
+        await session.execute(
+            update(TrackModel).where(TrackModel.id.in_(mismatches)).values(vote_count=actual_count),
+        )
+
+        invalidate_top(session)
+        for track_id in mismatches:
+            invalidate(session, get_track_by_id, track_id)
+
+    return mismatches
+
+
+async def reconcile_vote_counts() -> None:
+    """Find and fix tracks whose vote_count doesn't match their votes."""
+    async with sessionmaker() as session:
+        mismatches = await check_vote_counts(session, repair=True)
+        await session.commit()
+        await apply_invalidations(session)
+
+    for track_id, (stored, actual) in mismatches.items():
+        logger.warning(f"Track {track_id} had vote_count {stored} instead of {actual}")
@@ -3,8 +3,11 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from sqlalchemy import exists, select, update
+from sqlalchemy.dialects.postgresql import insert
 
-from bot.cache.redis import DAY, build_key, cached, clear_cache
+from bot.cache.invalidation import invalidate
+from bot.cache.redis import DAY, HOUR, build_key, cached
+from bot.cache.serialization import ModelSerializer
 from bot.database.models import UserModel
 from bot.services import errors
 
@@ -12,7 +15,7 @@ if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
 
-@cached(ttl=DAY, key_builder=lambda session, user_id: build_key(user_id))
+@cached(ttl=DAY, key_builder=lambda session, user_id: build_key(user_id), versioned=True, local_ttl=HOUR)
 async def user_exists(
     session: AsyncSession,
     user_id: int,
@@ -23,7 +26,11 @@ async def user_exists(
     return bool(result)
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+@cached(
+    key_builder=lambda session, user_id: build_key(user_id),
+    serializer=ModelSerializer(UserModel),
+    versioned=True,
+)
 async def get_user(
     session: AsyncSession,
     user_id: int,
@@ -39,20 +46,31 @@ async def create_user(
     first_name: str | None,
     last_name: str | None,
     deep_link: str | None,
-) -> UserModel:
-    """Create a new user."""
-    new_user = UserModel(
-        id=user_id,
-        username=username,
-        first_name=first_name,
-        last_name=last_name,
-        deep_link=deep_link,
+) -> UserModel | None:
+    """Create a new user.
+
+    Returns:
+        The new user, or None if the user already exists, e.g. created by a concurrent update.
+
+    """
+    query = (
+        insert(UserModel)
+        .values(
+            id=user_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            deep_link=deep_link,
+        )
+        .on_conflict_do_nothing(index_elements=[UserModel.id])
+        .returning(UserModel)
     )
+    new_user = await session.scalar(query)
+    if new_user is None:
+        return None
 
-    session.add(new_user)
-    await session.flush()
-    await clear_cache(user_exists, user_id)
-    await clear_cache(get_user, user_id)
+    invalidate(session, user_exists, user_id)
+    invalidate(session, get_user, user_id)
 
     return new_user
 
@@ -80,4 +98,4 @@ async def set_has_blocked_bot(
 
     await session.execute(update(UserModel).where(UserModel.id == user_id).values(has_blocked_bot=has_blocked_bot))
 
-    await clear_cache(get_user, user_id)
+    invalidate(session, get_user, user_id)
@@ -1,23 +1,45 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import os
+import socket
+from collections import Counter
+from contextlib import suppress
+from typing import TYPE_CHECKING, NamedTuple, NoReturn
 
-from psycopg.errors import ForeignKeyViolation, UniqueViolation
-from sqlalchemy import func, select
-from sqlalchemy.exc import IntegrityError
+from loguru import logger
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import BigInteger, Integer, any_, bindparam, exists, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import aliased
 
-from bot.cache.redis import build_key, cached, clear_cache
-from bot.database.models import VoteModel
-from bot.services import errors
-from bot.services.track import get_tracks_by_votes
+from bot.cache.invalidation import apply_invalidations, invalidate
+from bot.cache.redis import build_key, cached, cached_many
+from bot.core.loader import redis_client, sessionmaker, settings
+from bot.database.models import TrackModel, UserModel, VoteModel
+from bot.services import errors, leaderboard, voters
+from bot.services.normalization import normalize
+from bot.services.track import get_tracks_by_ids, invalidate_new_track, invalidate_top
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
 
+    from redis.asyncio import Redis
     from sqlalchemy.ext.asyncio import AsyncSession
 
+# Votes acknowledged to users but not inserted yet, read by the writers through a consumer group
+VOTE_STREAM_KEY = "votes:stream"
+VOTE_WRITERS_GROUP = "writers"
+# Each process reads as its own consumer, so writers of several instances don't share pending votes
+VOTE_WRITER = f"writer:{socket.gethostname()}:{os.getpid()}"
+# Votes that couldn't be inserted in max_attempts deliveries, kept for inspection
+VOTE_DEAD_LETTER_KEY = "votes:dead"
+# Seconds the writer blocks waiting for a vote when the stream is empty
+VOTE_WRITER_BLOCK = 5
 
-@cached(key_builder=lambda session, track_id: build_key(track_id))
+
+@cached(key_builder=lambda session, track_id: build_key(track_id), versioned=True)
 async def get_votes_count_by_track(
     session: AsyncSession,
     track_id: int,
@@ -27,6 +49,48 @@ async def get_votes_count_by_track(
     return result.scalar_one()
 
 
+@cached_many(get_votes_count_by_track, default=0)
+async def get_votes_counts(
+    session: AsyncSession,
+    track_ids: Sequence[int],
+) -> dict[int, int]:
+    """Get the number of votes of several tracks.
+
+    Returns:
+        Mapping of every requested track id to its vote count.
+
+    """
+    query = (
+        select(VoteModel.track_id, func.count(VoteModel.id))
+        .where(VoteModel.track_id == any_(bindparam("track_ids", list(track_ids), ARRAY(Integer))))
+        .group_by(VoteModel.track_id)
+    )
+    result = await session.execute(query)
+    return dict(result.tuples().all())
+
+
+async def get_trending_page(
+    session: AsyncSession,
+    limit: int = 10,
+    offset: int = 0,
+) -> tuple[list[tuple[TrackModel, int]], int]:
+    """Get a page of unused tracks with votes, trending first, and the number of such tracks.
+
+    Tracks are ranked by their votes, each weighted less the older it is, see leaderboard.
+
+    Returns:
+        Tuple of the page, a list of (TrackModel, vote_count), and the number of tracks.
+
+    """
+    track_ids = await leaderboard.get_trending_page(session, limit=limit, offset=offset)
+    tracks = await get_tracks_by_ids(session, track_ids)
+    vote_counts = await get_votes_counts(session, track_ids)
+
+    # A track deleted after the page was read is skipped
+    page = [(track, vote_counts[track_id]) for track_id in track_ids if (track := tracks[track_id]) is not None]
+    return page, await leaderboard.get_trending_size(session)
+
+
 async def get_votes_by_track(
     session: AsyncSession,
     track_id: int,
@@ -40,9 +104,14 @@ async def create_vote(
     session: AsyncSession,
     user_id: int,
     track_id: int,
-) -> VoteModel:
+) -> VoteModel | None:
     """Create a new vote.
 
+    With buffered votes enabled, the vote is appended to the vote stream right away, as it's
+    its only write, and None is returned. The vote is inserted later by a writer, which drops
+    duplicates and votes for missing tracks or users instead of raising, so the track must be
+    committed already. The user is only added to the voters of the track once it's inserted.
+
     Raises:
         VoteAlreadyExistsError: If vote already exists.
         TrackNotFoundError: If track doesn't exist.
@@ -50,33 +119,361 @@ async def create_vote(
         VoteServiceError: If vote creation fails.
 
     """
-    new_vote = VoteModel(
-        user_id=user_id,
-        track_id=track_id,
+    # Repeated taps are answered from Redis, without a failed insert and a rollback
+    if await voters.has_voted(user_id, track_id):
+        msg = f"vote already exists for user {user_id} and track {track_id}"
+        raise errors.VoteAlreadyExistsError(msg)
+
+    if settings.votes.buffered:
+        # Once appended the vote is durable, the user is only told so if it was
+        try:
+            await redis_client.xadd(VOTE_STREAM_KEY, {"user_id": user_id, "track_id": track_id})
+        except RedisError as e:
+            raise errors.VoteServiceError(str(e)) from e
+
+        return None
+
+    # Only inserted if the track and the user exist and the vote doesn't, instead of failing
+    query = (
+        insert(VoteModel)
+        .from_select(
+            ["user_id", "track_id"],
+            select(literal(user_id, BigInteger), literal(track_id)).where(
+                exists().where(UserModel.id == user_id),
+                exists().where(TrackModel.id == track_id),
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=[VoteModel.user_id, VoteModel.track_id])
+        .returning(VoteModel)
     )
-    session.add(new_vote)
 
     try:
-        await session.flush()
+        # Scoped to a savepoint, so a track or user deleted after the check doesn't abort the rest of the transaction
+        async with session.begin_nested():
+            new_vote = await session.scalar(query)
     except IntegrityError as e:
-        await session.rollback()
+        raise errors.VoteServiceError(str(e)) from e
 
-        if isinstance(e.orig, UniqueViolation):
-            msg = f"vote already exists for user {user_id} and track {track_id}"
-            raise errors.VoteAlreadyExistsError(msg) from e
+    if new_vote is None:
+        await _raise_vote_not_created(session, user_id, track_id)
 
-        if isinstance(e.orig, ForeignKeyViolation):
-            match e.orig.diag.table_name:
-                case "tracks":
-                    msg = f"track {track_id} not found"
-                    raise errors.TrackNotFoundError(msg) from e
-                case "users":
-                    msg = f"user {user_id} not found"
-                    raise errors.UserNotFoundError(msg) from e
+    invalidate_new_vote(session, user_id, track_id)
 
-        raise errors.VoteServiceError(str(e)) from e
+    return new_vote
 
-    await clear_cache(get_tracks_by_votes)
-    await clear_cache(get_votes_count_by_track, track_id)
 
-    return new_vote
+async def _raise_vote_not_created(session: AsyncSession, user_id: int, track_id: int) -> NoReturn:
+    query = select(
+        exists().where(VoteModel.user_id == user_id, VoteModel.track_id == track_id),
+        exists().where(TrackModel.id == track_id),
+    )
+    vote_exists, track_exists = (await session.execute(query)).one()
+
+    if vote_exists:
+        await voters.remember_voter(user_id, track_id)
+        msg = f"vote already exists for user {user_id} and track {track_id}"
+        raise errors.VoteAlreadyExistsError(msg)
+
+    if not track_exists:
+        msg = f"track {track_id} not found"
+        raise errors.TrackNotFoundError(msg)
+
+    msg = f"user {user_id} not found"
+    raise errors.UserNotFoundError(msg)
+
+
+def invalidate_new_vote(session: AsyncSession, user_id: int, track_id: int) -> None:
+    """Invalidate the caches a new vote changes once the session's transaction commits."""
+    invalidate_top(session)
+    invalidate(session, get_votes_count_by_track, track_id)
+    leaderboard.add_vote(session, track_id)
+    voters.add_voter(session, user_id, track_id)
+
+
+class TrackVote(NamedTuple):
+    track: TrackModel
+    is_new_track: bool
+    is_new_vote: bool
+
+
+async def create_track_and_vote(
+    session: AsyncSession,
+    user_id: int,
+    title: str,
+    artist: str,
+) -> TrackVote | None:
+    """Create the track unless it exists and vote for it unless it's used, in a single statement.
+
+    The track is upserted and the vote inserted by data-modifying CTEs, both skipping rows that
+    already exist instead of failing, so nothing is rolled back.
+
+    Returns:
+        The track, whether it was created and whether the vote was, or None if the track was
+        created by a concurrent transaction, which the statement can't see yet.
+
+    """
+    new_track = (
+        insert(TrackModel)
+        # Python-side column defaults aren't applied to statements in a CTE
+        .values(
+            title=title,
+            artist=artist,
+            title_search_key=normalize(title),
+            artist_search_key=normalize(artist),
+            vote_count=0,
+        )
+        .on_conflict_do_nothing(index_elements=[TrackModel.artist, TrackModel.title])
+        .returning(*TrackModel.__table__.c)
+        .cte("new_track")
+    )
+    # Data-modifying CTEs share the statement's snapshot, an existing track is only in tracks
+    track = union_all(
+        select(new_track),
+        select(*TrackModel.__table__.c).where(TrackModel.title == title, TrackModel.artist == artist),
+    ).cte("track")
+    new_vote = (
+        insert(VoteModel)
+        .from_select(
+            ["user_id", "track_id"],
+            select(literal(user_id, BigInteger), track.c.id).where(
+                track.c.tiktok_url.is_(None),
+                track.c.youtube_url.is_(None),
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=[VoteModel.user_id, VoteModel.track_id])
+        .returning(VoteModel.id)
+        .cte("new_vote")
+    )
+
+    query = select(
+        aliased(TrackModel, track),
+        exists(select(new_track.c.id)),
+        exists(select(new_vote.c.id)),
+    )
+    row = (await session.execute(query)).one_or_none()
+    if row is None:
+        return None
+
+    result = TrackVote(*row)
+    if result.is_new_track:
+        invalidate_new_track(session, result.track)
+    if result.is_new_vote:
+        invalidate_new_vote(session, user_id, result.track.id)
+
+    return result
+
+
+async def insert_votes(
+    session: AsyncSession,
+    votes: Sequence[tuple[int, int]],
+) -> int:
+    """Insert (user_id, track_id) votes with a single statement.
+
+    Votes that already exist, or whose track or user doesn't, are skipped, so inserting
+    the same votes again is a no-op. Caches are invalidated once for the whole batch.
+
+    Returns:
+        The number of inserted votes.
+
+    """
+    rows = func.unnest(
+        bindparam("user_ids", [user_id for user_id, _ in votes], ARRAY(BigInteger)),
+        bindparam("track_ids", [track_id for _, track_id in votes], ARRAY(Integer)),
+    ).table_valued("user_id", "track_id")
+
+    query = (
+        insert(VoteModel)
+        .from_select(
+            ["user_id", "track_id"],
+            select(rows.c.user_id, rows.c.track_id).where(
+                exists().where(UserModel.id == rows.c.user_id),
+                exists().where(TrackModel.id == rows.c.track_id),
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=[VoteModel.user_id, VoteModel.track_id])
+        .returning(VoteModel.user_id, VoteModel.track_id)
+    )
+    result = await session.execute(query)
+    inserted = result.tuples().all()
+    vote_counts = Counter(track_id for _, track_id in inserted)
+
+    if vote_counts:
+        invalidate_top(session)
+        for track_id in vote_counts:
+            invalidate(session, get_votes_count_by_track, track_id)
+        leaderboard.add_votes(session, vote_counts)
+        voters.add_voters(session, inserted)
+
+    return vote_counts.total()
+
+
+async def create_vote_writers_group(cache: Redis = redis_client) -> None:
+    """Create the vote stream and the consumer group of the writers, unless they exist."""
+    with suppress(ResponseError):
+        # The group already exists
+        await cache.xgroup_create(VOTE_STREAM_KEY, VOTE_WRITERS_GROUP, id="0", mkstream=True)
+
+
+async def write_votes(cache: Redis = redis_client, *, block: int | None = None) -> int:
+    """Insert the next batch of buffered votes, acknowledging them once committed.
+
+    Votes left pending for retry_interval, by a failed insert or a writer that stopped, are
+    retried first, and moved to the dead-letter stream once delivered max_attempts times.
+    A vote that can't be parsed is moved there right away. The group must have been created
+    with create_vote_writers_group.
+
+    Returns:
+        The number of votes read from the stream.
+
+    """
+    # Claiming a vote counts as one more delivery
+    _, entries, *_ = await cache.xautoclaim(
+        VOTE_STREAM_KEY,
+        VOTE_WRITERS_GROUP,
+        VOTE_WRITER,
+        min_idle_time=settings.votes.retry_interval * 1000,
+        start_id="0-0",
+        count=settings.votes.batch_size,
+    )
+    read = len(entries)
+    if entries:
+        entries = await _dead_letter_exhausted(cache, entries)
+    else:
+        response = await cache.xreadgroup(
+            VOTE_WRITERS_GROUP,
+            VOTE_WRITER,
+            {VOTE_STREAM_KEY: ">"},
+            count=settings.votes.batch_size,
+            block=block,
+        )
+        entries = response[0][1] if response else []
+        read = len(entries)
+
+    votes: dict[bytes, tuple[int, int]] = {}
+    malformed = []
+    for entry_id, fields in entries:
+        try:
+            votes[entry_id] = (int(fields[b"user_id"]), int(fields[b"track_id"]))
+        except (KeyError, ValueError):
+            malformed.append((entry_id, fields))
+
+    if malformed:
+        await _dead_letter(cache, malformed, reason="malformed")
+
+    inserted_ids = await _insert_buffered_votes(votes)
+
+    # A vote is only removed once inserted, one left pending is claimed again after retry_interval
+    if inserted_ids:
+        async with cache.pipeline(transaction=False) as pipeline:
+            await pipeline.xack(VOTE_STREAM_KEY, VOTE_WRITERS_GROUP, *inserted_ids)
+            await pipeline.xdel(VOTE_STREAM_KEY, *inserted_ids)
+            await pipeline.execute()
+
+    return read
+
+
+async def _insert_buffered_votes(votes: dict[bytes, tuple[int, int]]) -> list[bytes]:
+    """Insert votes keyed by their stream entry ids, one by one if the batch is rejected.
+
+    Returns:
+        Entry ids of the votes that were committed, including skipped duplicates.
+
+    """
+    if not votes:
+        return []
+
+    try:
+        async with sessionmaker() as session:
+            inserted = await insert_votes(session, list(votes.values()))
+            await session.commit()
+            await apply_invalidations(session)
+    except (DataError, IntegrityError) as e:
+        # Other errors, like a lost connection, fail every vote alike and reach the writer
+        if len(votes) == 1:
+            logger.warning(f"Failed to insert buffered vote {next(iter(votes.values()))}: {e}")
+            return []
+
+        logger.warning(f"Failed to insert {len(votes)} buffered votes, inserting them one by one: {e}")
+        inserted_ids = []
+        for entry_id, vote in votes.items():
+            inserted_ids += await _insert_buffered_votes({entry_id: vote})
+        return inserted_ids
+
+    logger.debug(f"inserted {inserted} of {len(votes)} buffered votes")
+    return list(votes)
+
+
+async def _dead_letter_exhausted(
+    cache: Redis,
+    entries: list[tuple[bytes, dict[bytes, bytes] | None]],
+) -> list[tuple[bytes, dict[bytes, bytes]]]:
+    """Move claimed votes delivered max_attempts times to the dead-letter stream.
+
+    Returns:
+        The claimed votes left to retry.
+
+    """
+    pending = await cache.xpending_range(
+        VOTE_STREAM_KEY,
+        VOTE_WRITERS_GROUP,
+        min=entries[0][0],
+        max=entries[-1][0],
+        count=len(entries),
+        consumername=VOTE_WRITER,
+    )
+    deliveries = {item["message_id"]: item["times_delivered"] for item in pending}
+
+    retried, exhausted = [], []
+    for entry_id, fields in entries:
+        if fields is None:
+            # Deleted from the stream while pending, nothing is left to insert
+            await cache.xack(VOTE_STREAM_KEY, VOTE_WRITERS_GROUP, entry_id)
+        elif deliveries.get(entry_id, 0) > settings.votes.max_attempts:
+            exhausted.append((entry_id, fields))
+        else:
+            retried.append((entry_id, fields))
+
+    if exhausted:
+        await _dead_letter(cache, exhausted, reason="exhausted")
+
+    return retried
+
+
+async def _dead_letter(
+    cache: Redis,
+    entries: list[tuple[bytes, dict[bytes, bytes]]],
+    reason: str,
+) -> None:
+    """Move votes from the vote stream to the dead-letter stream."""
+    async with cache.pipeline(transaction=True) as pipeline:
+        for entry_id, fields in entries:
+            await pipeline.xadd(VOTE_DEAD_LETTER_KEY, {**fields, b"entry_id": entry_id, b"reason": reason})
+        entry_ids = [entry_id for entry_id, _ in entries]
+        await pipeline.xack(VOTE_STREAM_KEY, VOTE_WRITERS_GROUP, *entry_ids)
+        await pipeline.xdel(VOTE_STREAM_KEY, *entry_ids)
+        await pipeline.execute()
+
+    logger.error(f"moved {len(entries)} buffered votes to {VOTE_DEAD_LETTER_KEY}: {reason}")
+
+
+async def run_vote_writer(cache: Redis = redis_client) -> None:
+    """Insert buffered votes into Postgres in batches until cancelled."""
+    is_group_created = False
+    while True:
+        try:
+            if not is_group_created:
+                await create_vote_writers_group(cache)
+                is_group_created = True
+
+            written = await write_votes(cache, block=VOTE_WRITER_BLOCK * 1000)
+        except (RedisError, SQLAlchemyError) as e:
+            logger.exception(f"Failed to write buffered votes: {e}")
+            # The group is gone with the stream if Redis lost its data
+            if isinstance(e, ResponseError) and str(e).startswith("NOGROUP"):
+                is_group_created = False
+            await asyncio.sleep(1)
+            continue
+
+        # Let votes accumulate into the next batch unless the stream is backlogged
+        if written < settings.votes.batch_size:
+            await asyncio.sleep(settings.votes.flush_interval)
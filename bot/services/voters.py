@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+
+from bot.cache.invalidation import on_commit
+from bot.core.loader import redis_client, sessionmaker
+from bot.database.models import VoteModel
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from redis.asyncio.client import Pipeline
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Set of ids of the users who voted for a track. A set may miss votes, never has extra ones,
+# so a member is a vote that exists and a missing member is checked in Postgres
+VOTERS_KEY = "voters:{track_id}"
+# Set once every vote was added, before that all votes are checked in Postgres
+BUILT_KEY = "voters:built"
+BACKFILL_LOCK_KEY = "voters:lock:backfill"
+BACKFILL_LOCK_TIMEOUT = 10 * 60
+BACKFILL_BATCH_SIZE = 1000
+
+
+async def has_voted(user_id: int, track_id: int) -> bool:
+    """Whether the user is known to have voted for the track, without querying Postgres."""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            await pipeline.exists(BUILT_KEY)
+            await pipeline.sismember(_key(track_id), user_id)
+            is_built, is_member = await pipeline.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to check voters of track {track_id}: {e}")
+        return False
+
+    return bool(is_built and is_member)
+
+
+def add_voter(session: AsyncSession, user_id: int, track_id: int) -> None:
+    """Add the user to the voters of the track once the session's transaction commits."""
+
+    async def command(pipeline: Pipeline) -> None:
+        await pipeline.sadd(_key(track_id), user_id)
+
+    on_commit(session, redis_client, command)
+
+
+def add_voters(session: AsyncSession, votes: Sequence[tuple[int, int]]) -> None:
+    """Add the users of (user_id, track_id) votes to the voters once the session's transaction commits."""
+    user_ids: defaultdict[int, list[int]] = defaultdict(list)
+    for user_id, track_id in votes:
+        user_ids[track_id].append(user_id)
+
+    async def command(pipeline: Pipeline) -> None:
+        for track_id, track_user_ids in user_ids.items():
+            await pipeline.sadd(_key(track_id), *track_user_ids)
+
+    on_commit(session, redis_client, command)
+
+
+async def remember_voter(user_id: int, track_id: int) -> None:
+    """Add the user to the voters of the track for a vote found in Postgres."""
+    try:
+        await redis_client.sadd(_key(track_id), user_id)
+    except RedisError as e:
+        logger.warning(f"Failed to add voter {user_id} of track {track_id}: {e}")
+
+
+def remove_track(session: AsyncSession, track_id: int) -> None:
+    """Drop the voters of a deleted track once the session's transaction commits."""
+
+    async def command(pipeline: Pipeline) -> None:
+        await pipeline.delete(_key(track_id))
+
+    on_commit(session, redis_client, command)
+
+
+async def backfill(*, force: bool = False) -> None:
+    """Add every vote in Postgres to the voters sets, unless they were backfilled before.
+
+    Members are only added, so votes committed meanwhile are kept and the sets are usable
+    while they are filled.
+    """
+    async with redis_client.lock(BACKFILL_LOCK_KEY, timeout=BACKFILL_LOCK_TIMEOUT):
+        if not force and await redis_client.exists(BUILT_KEY):
+            return
+
+        query = select(VoteModel.track_id, func.array_agg(VoteModel.user_id)).group_by(VoteModel.track_id)
+
+        votes = 0
+        async with sessionmaker() as session:
+            result = await session.stream(query.execution_options(yield_per=BACKFILL_BATCH_SIZE))
+            async for partition in result.tuples().partitions():
+                async with redis_client.pipeline(transaction=False) as pipeline:
+                    for track_id, user_ids in partition:
+                        await pipeline.sadd(_key(track_id), *user_ids)
+                        votes += len(user_ids)
+                    await pipeline.execute()
+
+        await redis_client.set(BUILT_KEY, 1)
+
+    logger.info(f"voters backfilled with {votes} votes")
+
+
+def _key(track_id: int) -> str:
+    return VOTERS_KEY.format(track_id=track_id)
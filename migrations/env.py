@@ -41,6 +41,9 @@ def include_object(
     reflected: bool,  # noqa: FBT001
     compare_to: SchemaItem | None,
 ) -> bool:
+    if type_ == "table" and object.info.get("is_view"):  # pyright: ignore[reportAttributeAccessIssue]
+        return False
+
     return not (type_ == "table" and name == "apscheduler_jobs")
 
 
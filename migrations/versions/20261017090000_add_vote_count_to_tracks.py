@@ -0,0 +1,72 @@
+"""add vote_count to tracks
+
+Revision ID: 81773ede827d
+Revises: 7c04e846c3d0
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '81773ede827d'
+down_revision: Union[str, None] = '7c04e846c3d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tracks', sa.Column('vote_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # Keep vote_count in the same transaction as every change to votes
+    op.execute(
+        """
+        CREATE FUNCTION update_track_vote_count() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE tracks SET vote_count = vote_count + 1 WHERE id = NEW.track_id;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE tracks SET vote_count = vote_count - 1 WHERE id = OLD.track_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER votes_update_track_vote_count
+        AFTER INSERT OR DELETE OR UPDATE OF track_id ON votes
+        FOR EACH ROW EXECUTE FUNCTION update_track_vote_count()
+        """
+    )
+
+    # Backfill after the trigger exists, adding the column locked tracks, so no vote is missed
+    op.execute(
+        """
+        UPDATE tracks
+        SET vote_count = counts.vote_count
+        FROM (SELECT track_id, count(*) AS vote_count FROM votes GROUP BY track_id) AS counts
+        WHERE tracks.id = counts.track_id
+        """
+    )
+
+    # The top only lists unused tracks, queries must filter with the same predicate to use it
+    op.create_index(
+        'ix_tracks_top',
+        'tracks',
+        [sa.text('vote_count DESC'), sa.text('id DESC')],
+        postgresql_where=sa.text('tiktok_url IS NULL AND youtube_url IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tracks_top', table_name='tracks')
+    op.execute('DROP TRIGGER votes_update_track_vote_count ON votes')
+    op.execute('DROP FUNCTION update_track_vote_count()')
+    op.drop_column('tracks', 'vote_count')
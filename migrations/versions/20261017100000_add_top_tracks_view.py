@@ -0,0 +1,44 @@
+"""add top_tracks materialized view
+
+Revision ID: 61032bf08274
+Revises: 81773ede827d
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '61032bf08274'
+down_revision: Union[str, None] = '81773ede827d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Unused and used tracks are ranked separately, so a page of the top is a range of ranks
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW top_tracks AS
+        SELECT
+            id AS track_id,
+            vote_count,
+            (tiktok_url IS NOT NULL OR youtube_url IS NOT NULL) AS is_used,
+            row_number() OVER (
+                PARTITION BY (tiktok_url IS NOT NULL OR youtube_url IS NOT NULL)
+                ORDER BY vote_count DESC, id DESC
+            ) AS rank
+        FROM tracks
+        """
+    )
+
+    # REFRESH MATERIALIZED VIEW CONCURRENTLY requires a unique index
+    op.create_index('ix_top_tracks_track_id', 'top_tracks', ['track_id'], unique=True)
+    op.create_index('ix_top_tracks_rank', 'top_tracks', ['is_used', 'rank'], unique=True)
+
+
+def downgrade() -> None:
+    op.execute('DROP MATERIALIZED VIEW top_tracks')
@@ -0,0 +1,55 @@
+"""add trigram indexes on lowercased track columns
+
+Revision ID: 2b7e5f0c9a14
+Revises: 61032bf08274
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7e5f0c9a14'
+down_revision: Union[str, None] = '61032bf08274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Searches match lower(title) and lower(artist), which indexes on the raw columns can't serve
+    op.create_index(
+        'ix_tracks_lower_title_trgm',
+        'tracks',
+        [sa.text('lower(title) gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_tracks_lower_artist_trgm',
+        'tracks',
+        [sa.text('lower(artist) gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+
+    op.drop_index('idx_tracks_artist_trgm', table_name='tracks')
+    op.drop_index('idx_tracks_title_trgm', table_name='tracks')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'idx_tracks_title_trgm',
+        'tracks',
+        [sa.text('title gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'idx_tracks_artist_trgm',
+        'tracks',
+        [sa.text('artist gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+
+    op.drop_index('ix_tracks_lower_artist_trgm', table_name='tracks')
+    op.drop_index('ix_tracks_lower_title_trgm', table_name='tracks')
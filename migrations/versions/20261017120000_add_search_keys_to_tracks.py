@@ -0,0 +1,143 @@
+"""add search keys to tracks
+
+Revision ID: 9d41c6e2b853
+Revises: 2b7e5f0c9a14
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+import re
+from typing import Sequence, Union
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41c6e2b853'
+down_revision: Union[str, None] = '2b7e5f0c9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# A copy of bot.services.normalization as of this revision, so later changes to the service
+# don't change what this migration computes
+_TRANSLITERATION = str.maketrans({
+    'а': 'a',
+    'б': 'b',
+    'в': 'v',
+    'г': 'g',
+    'д': 'd',
+    'е': 'e',
+    'ё': 'e',
+    'ж': 'zh',
+    'з': 'z',
+    'и': 'i',
+    'й': 'y',
+    'к': 'k',
+    'л': 'l',
+    'м': 'm',
+    'н': 'n',
+    'о': 'o',
+    'п': 'p',
+    'р': 'r',
+    'с': 's',
+    'т': 't',
+    'у': 'u',
+    'ф': 'f',
+    'х': 'h',
+    'ц': 'ts',
+    'ч': 'ch',
+    'ш': 'sh',
+    'щ': 'sch',
+    'ъ': '',
+    'ы': 'y',
+    'ь': '',
+    'э': 'e',
+    'ю': 'yu',
+    'я': 'ya',
+    'і': 'i',
+    'ї': 'yi',
+    'є': 'ye',
+    'ґ': 'g',
+})
+_APOSTROPHES = re.compile(r"['’`ʼ]")
+_PUNCTUATION = re.compile(r'[\W_]+')
+_STOP_TOKENS = frozenset({'feat', 'ft', 'featuring', 'prod'})
+
+
+def normalize(value: str) -> str:
+    value = unicodedata.normalize('NFKC', value).casefold()
+    value = value.translate(_TRANSLITERATION)
+    value = _APOSTROPHES.sub('', value)
+    words = _PUNCTUATION.sub(' ', value).split()
+    return ' '.join(word for word in words if word not in _STOP_TOKENS)
+
+
+def upgrade() -> None:
+    op.add_column('tracks', sa.Column('artist_search_key', sa.Text(), nullable=True))
+    op.add_column('tracks', sa.Column('title_search_key', sa.Text(), nullable=True))
+
+    # Keys are computed in Python, the same way the track service sets them at this revision
+    tracks = sa.table(
+        'tracks',
+        sa.column('id', sa.Integer()),
+        sa.column('artist', sa.String()),
+        sa.column('title', sa.String()),
+        sa.column('artist_search_key', sa.Text()),
+        sa.column('title_search_key', sa.Text()),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(tracks.c.id, tracks.c.artist, tracks.c.title)).all()
+    if rows:
+        connection.execute(
+            tracks.update()
+            .where(tracks.c.id == sa.bindparam('track_id'))
+            .values(
+                artist_search_key=sa.bindparam('artist_key'),
+                title_search_key=sa.bindparam('title_key'),
+            ),
+            [
+                {'track_id': track_id, 'artist_key': normalize(artist), 'title_key': normalize(title)}
+                for track_id, artist, title in rows
+            ],
+        )
+
+    op.alter_column('tracks', 'artist_search_key', nullable=False)
+    op.alter_column('tracks', 'title_search_key', nullable=False)
+
+    # Searches match the keys instead of the lowercased columns
+    op.create_index(
+        'ix_tracks_title_search_key_trgm',
+        'tracks',
+        [sa.text('title_search_key gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_tracks_artist_search_key_trgm',
+        'tracks',
+        [sa.text('artist_search_key gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+    op.drop_index('ix_tracks_lower_artist_trgm', table_name='tracks')
+    op.drop_index('ix_tracks_lower_title_trgm', table_name='tracks')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_tracks_lower_title_trgm',
+        'tracks',
+        [sa.text('lower(title) gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_tracks_lower_artist_trgm',
+        'tracks',
+        [sa.text('lower(artist) gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+    op.drop_index('ix_tracks_artist_search_key_trgm', table_name='tracks')
+    op.drop_index('ix_tracks_title_search_key_trgm', table_name='tracks')
+
+    op.drop_column('tracks', 'title_search_key')
+    op.drop_column('tracks', 'artist_search_key')
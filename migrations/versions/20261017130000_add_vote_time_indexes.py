@@ -0,0 +1,28 @@
+"""add indexes on vote times
+
+Revision ID: 11a337879ffc
+Revises: 9d41c6e2b853
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11a337879ffc'
+down_revision: Union[str, None] = '9d41c6e2b853'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The trending reconcile finds the tracks voted for since its watermark, then reads their votes
+    op.create_index('ix_votes_created_at', 'votes', ['created_at'])
+    op.create_index('ix_votes_track_id_created_at', 'votes', ['track_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_votes_track_id_created_at', table_name='votes')
+    op.drop_index('ix_votes_created_at', table_name='votes')